@@ -0,0 +1,94 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Cost of converting the values returned by the players to python types.
+
+`mpris.convert_value`, found from the types of the values or given the
+D-Bus signature, is compared with the handling it replaced : `Remote.get`
+only encoded a top level string and left containers as dbus types, and
+`native`, used by `Track`, walked them with a chain of isinstance tests.
+Both are copied below as they were. The payloads are the replies of
+GetTracksMetadata, of the Tracks property and of GetPlaylists. No bus is
+needed, the best of `REPEAT` runs is kept.
+
+Usage: bench_convert.py
+"""
+
+__docformat__ = 'reStructuredText'
+
+import timeit
+
+import dbus
+
+from bench_track import synth
+
+REPEAT = 5
+
+def remote_get(got):
+	"""
+	Conversion done by `Remote.get` before `convert_value`.
+	"""
+	if type(got) is dbus.String:
+		return got.encode('utf-8')
+	
+	return got
+
+def native(value):
+	"""
+	Conversion done for `Track` before `convert_value`.
+	"""
+	if isinstance(value, dbus.String):
+		return value.encode('utf-8')
+	elif isinstance(value, (dbus.ObjectPath, dbus.Signature)):
+		return str(value)
+	elif isinstance(value, dbus.Boolean):
+		return bool(value)
+	elif isinstance(value, dbus.Double):
+		return float(value)
+	elif isinstance(value, (int, long)):
+		return int(value)
+	elif isinstance(value, dict):
+		return dict((native(k), native(v)) for k, v in value.iteritems())
+	elif isinstance(value, (list, tuple)):
+		return tuple(native(item) for item in value)
+	
+	return value
+
+def payloads():
+	"""
+	:return: tuples (name, signature, value)
+	"""
+	return [
+		("aa{sv}, 10k maps", 'aa{sv}',
+			dbus.Array([synth(i) for i in xrange(10000)], signature='a{sv}')),
+		("ao, 50k paths", 'ao',
+			dbus.Array([dbus.ObjectPath("/t/%d" % i) for i in xrange(50000)],
+				signature='o')),
+		("a(oss), 10k", 'a(oss)',
+			dbus.Array([dbus.Struct((dbus.ObjectPath("/pl/%d" % i),
+				dbus.String("Playlist %d" % i), dbus.String("")), signature='oss')
+					for i in xrange(10000)], signature='(oss)')),
+	]
+
+def best(function, value):
+	"""
+	Best time of `function` on `value`, in milliseconds.
+	"""
+	return min(timeit.repeat(lambda: function(value), number=1,
+		repeat=REPEAT)) * 1000
+
+def main():
+	from mpris import convert_value
+	
+	print "%-18s %12s %12s %12s %12s" % \
+		("", "Remote.get", "native", "by type", "signature")
+	
+	for name, signature, value in payloads():
+		print "%-18s %9.1f ms %9.1f ms %9.1f ms %9.1f ms" % (name,
+			best(remote_get, value), best(native, value),
+			best(convert_value, value),
+			best(lambda value: convert_value(value, signature), value))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Memory used by the metadata of a long tracklist, as received from D-Bus
+and as `mpris.Track` records.
+
+Synthetic metadata is built for `TRACKS` tracks, with the keys players
+usually send and a realistic number of distinct artists, albums and
+genres. Each track gets objects of its own, as when they are unpacked
+from a message. The size of a set of objects is the sum of the sizes of
+all the objects reachable from it, each counted once, so that strings
+shared by interning are only counted once. Classes and modules are not
+counted. No bus is needed.
+
+Usage: bench_track.py [tracks]
+"""
+
+__docformat__ = 'reStructuredText'
+
+import sys, gc, time, types
+
+import dbus
+
+TRACKS  = 100000
+ARTISTS = 3000
+ALBUMS  = 8000
+GENRES  = 20
+
+def synth(i):
+	"""
+	Metadata of the track number `i`, with dbus types.
+	"""
+	artist = dbus.Array([dbus.String("Artist %d" % (i % ARTISTS))],
+		signature='s', variant_level=1)
+	
+	return dbus.Dictionary({
+		'mpris:trackid': dbus.ObjectPath(
+			"/org/mpris/MediaPlayer2/Track/%d" % i, variant_level=1),
+		'mpris:length': dbus.Int64(180000000 + i, variant_level=1),
+		'xesam:title': dbus.String("Title number %d" % i, variant_level=1),
+		'xesam:artist': artist,
+		'xesam:album': dbus.String("Album %d" % (i % ALBUMS), variant_level=1),
+		'xesam:albumArtist': dbus.Array(list(artist), signature='s',
+			variant_level=1),
+		'xesam:genre': dbus.Array([dbus.String("Genre %d" % (i % GENRES))],
+			signature='s', variant_level=1),
+		'xesam:trackNumber': dbus.Int32(i % 12, variant_level=1),
+		'xesam:url': dbus.String("file:///music/artist%d/album%d/%d.ogg" % \
+			(i % ARTISTS, i % ALBUMS, i), variant_level=1),
+	}, signature='sv')
+
+def deep_size(objects):
+	"""
+	Size in bytes of the objects and of everything they refer to, each
+	object counted once.
+	"""
+	seen    = set()
+	pending = list(objects)
+	size    = 0
+	
+	while pending:
+		obj = pending.pop()
+		
+		if id(obj) in seen or isinstance(obj, (type, types.ModuleType)):
+			continue
+		
+		seen.add(id(obj))
+		size += sys.getsizeof(obj)
+		pending.extend(gc.get_referents(obj))
+	
+	return size
+
+def main(argv):
+	from mpris import Track
+	
+	count = len(argv) > 1 and int(argv[1]) or TRACKS
+	raw   = [synth(i) for i in xrange(count)]
+	
+	start  = time.time()
+	tracks = [Track(metadata) for metadata in raw]
+	spent  = time.time() - start
+	
+	print "%d tracks, %d artists, %d albums, %d genres" % \
+		(count, ARTISTS, ALBUMS, GENRES)
+	print "dbus.Dictionary : %6.0f bytes per track" % \
+		(deep_size(raw) / float(count))
+	print "Track           : %6.0f bytes per track" % \
+		(deep_size(tracks) / float(count))
+	print "conversion      : %6.1f us per track" % (spent / count * 1e6)
+
+if __name__ == "__main__":
+	main(sys.argv)
@@ -0,0 +1,76 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Cold start check of mpris_remote.
+
+Usage, argument parsing and requests to the daemon must not import dbus,
+GLib, notify2 or mpris, and importing mpris_remote must stay within
+`BUDGET`. The import is timed in fresh interpreters, the best of `RUNS`
+is kept. Exits with status 1 if the check fails.
+"""
+
+__docformat__ = 'reStructuredText'
+
+import os, sys, subprocess
+
+#
+# Maximum time to import mpris_remote, in seconds.
+#
+BUDGET = 0.010
+RUNS   = 5
+
+#
+# Top level packages which must not be loaded by the import.
+#
+FORBIDDEN = ('dbus', 'gobject', 'glib', 'gi', 'notify2', 'mpris', 'ssl')
+
+CHILD = """
+import sys, time
+start = time.time()
+import mpris_remote
+spent = time.time() - start
+print spent
+print " ".join(name for name in sys.modules if sys.modules[name] is not None)
+"""
+
+def measure():
+	"""
+	Import mpris_remote in a new interpreter.
+	
+	:return: a tuple (time, loaded modules)
+	"""
+	output = subprocess.check_output([sys.executable, "-c", CHILD],
+		cwd=os.path.dirname(os.path.abspath(__file__)))
+	spent, modules = output.split("\n")[:2]
+	
+	return float(spent), modules.split()
+
+def main():
+	best   = None
+	failed = False
+	
+	for i in range(RUNS):
+		spent, modules = measure()
+		
+		if best is None or spent < best:
+			best = spent
+	
+	loaded = sorted(name for name in modules \
+		if name.split('.')[0] in FORBIDDEN)
+	
+	if loaded:
+		print "forbidden modules loaded:", ", ".join(loaded)
+		failed = True
+	
+	print "import mpris_remote: %.2f ms, budget %.2f ms, %d modules" % \
+		(best * 1000, BUDGET * 1000, len(modules))
+	
+	if best > BUDGET:
+		print "over budget"
+		failed = True
+	
+	exit(failed and 1 or 0)
+
+if __name__ == "__main__":
+	main()
@@ -10,39 +10,210 @@ MPRIS Version 2.2
 	Guilhelm SAVIN <gsavin@lewub.org>
 """
 
-__all__ = ('MPRIS', 'Root', 'Player', 'Tracklist', 'Playlists')
+__all__ = ('MPRIS', 'Root', 'Player', 'Tracklist', 'Playlists',
+	'PositionClock', 'Batch', 'Registry', 'TrackListMirror', 'MetadataCache',
+	'Track', 'PlaylistBrowser', 'PlaylistIndex', 'TrackIndex',
+	'SignalDispatcher', 'Session')
 __docformat__ = 'reStructuredText'
 
-import gobject
-gobject.threads_init()
+#
+# Only dbus is imported here. GLib is imported, and threads initialised, by
+# `mainloop` when a main loop is actually run ; notify2 on first notification.
+#
+import dbus, dbus.lowlevel, sys, os, re, time, json, collections, bisect
+import mimetypes, traceback
 
-from dbus import glib
-glib.init_threads()
+def session_bus():
+	"""
+	Get the shared connection to the session bus. The GLib main loop is set
+	as the default dbus main loop before the connection is made, so that
+	signals are dispatched once a main loop runs. This does not import
+	GLib itself.
+	"""
+	from dbus.mainloop.glib import DBusGMainLoop
+	
+	if dbus.get_default_main_loop() is None:
+		DBusGMainLoop(set_as_default=True)
+	
+	return dbus.SessionBus()
 
-import dbus, sys, notify2
+def mainloop():
+	"""
+	Prepare for running a GLib main loop : import gobject and initialise
+	threads, once.
+	
+	:return: the gobject module
+	"""
+	import gobject
+	
+	if not getattr(mainloop, 'initialised', False):
+		from dbus.mainloop.glib import threads_init
+		
+		gobject.threads_init()
+		threads_init()
+		mainloop.initialised = True
+	
+	return gobject
 
-def find_mpris_connection():
+def iterate_until(condition, timeout):
 	"""
+	Run the default main context until `condition` returns true, for at
+	most `timeout` seconds.
+	
+	:return: the last result of `condition`
 	"""
-	available = {}
-	bus = dbus.SessionBus()
+	gobject = mainloop()
+	context = gobject.main_context_default()
+	expired = []
+	source  = gobject.timeout_add(int(timeout * 1000),
+		lambda: expired.append(True))
+	
+	try:
+		while not condition() and not expired:
+			context.iteration(True)
+	finally:
+		if not expired:
+			gobject.source_remove(source)
+	
+	return condition()
+
+def discover_players(bus=None):
+	"""
+	Find the available players with the unique name owning their
+	connection.
+	
+	Names owned on the bus are listed with a single ListNames call, then
+	the owners and the identities of all the players found are requested
+	concurrently.
+	
+	:Parameters:
+		`bus` : dbus.Bus
+			bus to look on, defaults to the session bus
 	
-	for player in MPRIS.PLAYERS:
+	:return: tuples (owner, identity) indexed by the bus name of the players
+		without `MPRIS.CONNECTION_PREFIX`
+	"""
+	available = {}
+	replies   = {}
+	bus       = bus or session_bus()
+	batch     = Batch(bus)
+	
+	for name in bus.list_names():
+		if name.startswith(MPRIS.CONNECTION_PREFIX):
+			player = name[len(MPRIS.CONNECTION_PREFIX):].encode('utf-8')
+			replies[player] = (
+				batch.call(BUS_NAME, BUS_PATH, BUS_NAME, "GetNameOwner", "s",
+					(name,)),
+				batch.call(name, MPRIS.OBJECT_PATH,
+					MPRIS.INTERFACE_PROPERTIES, "Get", "ss",
+					(MPRIS.INTERFACE_ROOT, "Identity")))
+	
+	for player in replies:
+		owner, identity = replies[player]
+		
 		try:
-			mpris      = bus.get_object(MPRIS.CONNECTION_PREFIX + player, MPRIS.OBJECT_PATH)
-			properties = dbus.Interface(mpris, MPRIS.INTERFACE_PROPERTIES)
-			identity   = properties.Get(MPRIS.INTERFACE_ROOT, "Identity")
-			
-			available[player] = identity.encode('utf-8')
-		except:
+			available[player] = (owner.wait().encode('utf-8'),
+				identity.wait().encode('utf-8'))
+		except dbus.DBusException:
 			pass
-		
+	
 	return available
 
-def list_available_connection():
+def find_mpris_connection(bus=None):
+	"""
+	Find the available players, see `discover_players`.
+	
+	:return: identities of the players, indexed by their bus name without
+		`MPRIS.CONNECTION_PREFIX`
+	"""
+	available = discover_players(bus)
+	
+	for player in available:
+		available[player] = available[player][1]
+	
+	return available
+
+def cache_path():
+	"""
+	Path of the on-disk cache of `cached_mpris_connection`.
+	"""
+	cache = os.environ.get('XDG_CACHE_HOME') or \
+		os.path.join(os.path.expanduser("~"), ".cache")
+	
+	return os.path.join(cache, "mpris-controller", "players.json")
+
+def cached_mpris_connection(bus=None, path=None):
 	"""
+	Same as `find_mpris_connection`, for one-shot callers, using an on-disk
+	cache of the last discovery.
+	
+	The cache is used if it was written for the same bus address and if
+	the names of the players are still owned by the same connections. This
+	is checked with one ListNames call and concurrent GetNameOwner calls,
+	all answered by the bus itself, instead of querying the players.
+	
+	:Parameters:
+		`bus` : dbus.Bus
+			bus to look on, defaults to the session bus
+		`path` : string
+			path of the cache, see `cache_path`
 	"""
-	available = find_mpris_connection()
+	bus     = bus or session_bus()
+	path    = path or cache_path()
+	address = os.environ.get('DBUS_SESSION_BUS_ADDRESS', "")
+	cached  = None
+	
+	try:
+		with open(path) as f:
+			cached = json.load(f)
+	except (IOError, ValueError):
+		pass
+	
+	if cached is not None and cached.get('address') == address:
+		players = cached.get('players', {})
+		names   = set(MPRIS.CONNECTION_PREFIX + player for player in players)
+		current = set(name for name in bus.list_names() \
+			if name.startswith(MPRIS.CONNECTION_PREFIX))
+		
+		if names == current:
+			batch   = Batch(bus)
+			replies = [(batch.call(BUS_NAME, BUS_PATH, BUS_NAME, "GetNameOwner",
+				"s", (MPRIS.CONNECTION_PREFIX + player,)), players[player][0]) \
+				for player in players]
+			
+			try:
+				valid = all(reply.wait() == owner for reply, owner in replies)
+			except dbus.DBusException:
+				valid = False
+			
+			if valid:
+				return dict((player.encode('utf-8'),
+					players[player][1].encode('utf-8')) for player in players)
+	
+	players = discover_players(bus)
+	
+	try:
+		if not os.path.isdir(os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path))
+		
+		with open(path + ".tmp", "w") as f:
+			json.dump({ 'address': address, 'players': players }, f)
+		
+		os.rename(path + ".tmp", path)
+	except (IOError, OSError):
+		pass
+	
+	return dict((player, players[player][1]) for player in players)
+
+def list_available_connection(available=None):
+	"""
+	:Parameters:
+		`available` : dict
+			result of a previous discovery, players are discovered again if
+			not given
+	"""
+	if available is None:
+		available = find_mpris_connection()
 	
 	if len(available) == 0:
 		print "no player is available"
@@ -51,75 +222,530 @@ def list_available_connection():
 		for player in available:
 			print "-", player, ":", available[player]
 
+BUS_NAME = "org.freedesktop.DBus"
+BUS_PATH = "/org/freedesktop/DBus"
+
+class Registry:
+	"""
+	Available players, kept up to date from the NameOwnerChanged signal of
+	the bus. Long running callers read the players from memory instead of
+	discovering them again.
+	
+	Functions in `listeners` are called with the name of a player and its
+	new owner, None when the player went away, on every change.
+	
+	Signals are only received while a main loop is running.
+	"""
+	def __init__(self, bus=None):
+		"""
+		:Parameters:
+			`bus` : dbus.Bus
+				bus to watch, defaults to the session bus
+		"""
+		self.bus = bus or session_bus()
+		self.bus.add_signal_receiver(self.owner_changed, "NameOwnerChanged",
+			BUS_NAME, BUS_NAME, BUS_PATH)
+		
+		self.owners    = {}
+		self.players   = {}
+		self.listeners = []
+		
+		available = discover_players(self.bus)
+		
+		for player in available:
+			self.owners[player], self.players[player] = available[player]
+	
+	def owner_changed(self, name, old_owner, new_owner):
+		"""
+		Handler of the NameOwnerChanged signal.
+		"""
+		if not name.startswith(MPRIS.CONNECTION_PREFIX):
+			return
+		
+		player = name[len(MPRIS.CONNECTION_PREFIX):].encode('utf-8')
+		
+		self.owners.pop(player, None)
+		self.players.pop(player, None)
+		
+		if new_owner:
+			def identity(value):
+				if self.owners.get(player) == new_owner:
+					self.players[player] = value.encode('utf-8')
+			
+			def error(e):
+				self.owners.pop(player, None)
+			
+			self.owners[player] = new_owner.encode('utf-8')
+			self.bus.call_async(name, MPRIS.OBJECT_PATH,
+				MPRIS.INTERFACE_PROPERTIES, "Get", "ss",
+				(MPRIS.INTERFACE_ROOT, "Identity"), identity, error)
+		
+		for listener in list(self.listeners):
+			listener(player, self.owners.get(player))
+
+class Session:
+	"""
+	One `MPRIS` object per available player, all on the shared session bus,
+	following the players appearing and going away with a `Registry`.
+	
+	The active player is the one which started playing last, according to
+	the PlaybackStatus of the players : it stays active when it pauses or
+	stops, unless an other player is playing. When the session is created,
+	a playing player is preferred, then a paused one.
+	
+	Signals are only received while a main loop is running. Without one,
+	the active player is the one chosen when the session was created.
+	"""
+	
+	#
+	# Order of preference of the playback statuses when choosing the active
+	# player.
+	#
+	PREFERENCE = ('Playing', 'Paused', 'Stopped')
+	
+	def __init__(self, registry=None, watch=False, players=None):
+		"""
+		:Parameters:
+			`registry` : Registry
+				registry of the players, a new one by default
+			`watch` : bool
+				given to the `MPRIS` objects, see `MPRIS`
+			`players` : list
+				names of the players, when they are already known, for
+				instance from `cached_mpris_connection` ; no `Registry` is
+				used then, and players appearing or going away are not
+				followed
+		
+		Players failing to answer, or already gone, are skipped.
+		"""
+		if players is None:
+			self.registry = registry or Registry()
+			self.bus      = self.registry.bus
+			players       = self.registry.owners.keys()
+			
+			self.registry.listeners.append(self.owner_changed)
+		else:
+			self.registry = None
+			self.bus      = session_bus()
+		
+		self.watching      = watch
+		self.players       = {}
+		self.statuses      = {}
+		self.played        = {}
+		self.subscriptions = {}
+		self.current       = None
+		
+		for player in players:
+			try:
+				self.add(player)
+			except dbus.DBusException:
+				pass
+		
+		self.statuses.update(self.poll())
+		self.elect()
+	
+	def __len__(self):
+		return len(self.players)
+	
+	def __iter__(self):
+		return iter(sorted(self.players))
+	
+	def get(self, player):
+		"""
+		Get the `MPRIS` object of a player.
+		
+		:raise KeyError: if the player is not available
+		"""
+		return self.players[player]
+	
+	def active(self):
+		"""
+		Get the `MPRIS` object of the active player, None if there is no
+		player.
+		"""
+		if self.current is None:
+			return None
+		
+		return self.players[self.current]
+	
+	def add(self, player):
+		"""
+		Create the `MPRIS` object of a player, replacing the previous one.
+		"""
+		self.remove(player)
+		
+		mpris        = MPRIS(player, watch=self.watching)
+		subscription = mpris.player.on_PropertiesChanged(
+			lambda interface, changed, invalidated: \
+				self.status_changed(player, changed), ('PlaybackStatus',))
+		
+		self.players[player]       = mpris
+		self.subscriptions[player] = subscription
+	
+	def remove(self, player):
+		"""
+		Drop the `MPRIS` object of a player, if any.
+		"""
+		subscription = self.subscriptions.pop(player, None)
+		
+		if subscription is not None:
+			subscription.remove()
+		
+		self.players.pop(player, None)
+		self.statuses.pop(player, None)
+		self.played.pop(player, None)
+	
+	def refresh(self, player):
+		"""
+		Create again the `MPRIS` object of a player, dropping its caches,
+		after an error. The player is dropped if it went away.
+		"""
+		try:
+			self.add(player)
+		except dbus.DBusException:
+			self.remove(player)
+		
+		if self.current not in self.players:
+			self.elect()
+	
+	def poll(self):
+		"""
+		Read the PlaybackStatus of all the players, concurrently.
+		
+		:return: dict of the statuses indexed by player
+		"""
+		batch   = Batch(self.bus)
+		replies = {}
+		
+		for player in self.players:
+			replies[player] = batch.call(self.players[player].conn,
+				MPRIS.OBJECT_PATH, MPRIS.INTERFACE_PROPERTIES, "Get", "ss",
+				(MPRIS.INTERFACE_PLAYER, "PlaybackStatus"))
+		
+		statuses = {}
+		
+		for player in replies:
+			try:
+				statuses[player] = convert_value(replies[player].wait())
+			except dbus.DBusException:
+				pass
+		
+		return statuses
+	
+	def elect(self):
+		"""
+		Choose the active player from the known statuses, then from the time
+		the players last started playing.
+		"""
+		def rank(player):
+			status = self.statuses.get(player)
+			
+			if status in Session.PREFERENCE:
+				preference = Session.PREFERENCE.index(status)
+			else:
+				preference = len(Session.PREFERENCE)
+			
+			return preference, -self.played.get(player, 0), player
+		
+		if self.players:
+			self.current = min(self.players, key=rank)
+		else:
+			self.current = None
+	
+	def call_all(self, method, signature=None, args=(), interface=None):
+		"""
+		Call a method on all the players, concurrently. The interface is the
+		one of `Player` by default.
+		
+		:return: dict of the `Reply` of each call, indexed by player
+		"""
+		interface = interface or MPRIS.INTERFACE_PLAYER
+		batch     = Batch(self.bus)
+		replies = {}
+		
+		for player in self.players:
+			replies[player] = batch.call(self.players[player].conn,
+				MPRIS.OBJECT_PATH, interface, method, signature, args)
+		
+		batch.wait()
+		
+		return replies
+	
+	def status_changed(self, player, changed):
+		"""
+		Handler of the PropertiesChanged signal of the players.
+		"""
+		if 'PlaybackStatus' not in changed:
+			return
+		
+		status = convert_value(changed['PlaybackStatus'])
+		self.statuses[player] = status
+		
+		if status == 'Playing':
+			self.current = player
+			self.played[player] = monotonic()
+		elif player == self.current:
+			playing = [other for other in self.players \
+				if self.statuses.get(other) == 'Playing']
+			
+			if playing:
+				self.current = max(playing,
+					key=lambda other: self.played.get(other, 0))
+	
+	def owner_changed(self, player, owner):
+		"""
+		Listener of the `Registry`.
+		"""
+		if owner is None:
+			self.remove(player)
+			
+			if self.current not in self.players:
+				self.elect()
+		else:
+			self.refresh(player)
+
 class MPRIS:
 	"""
 	Global MPRIS object connected to `Root`, `Player`, `Tracklist` and
 	`Playlists` dbus objects.
 	"""
 	
+	#
+	# Well known players. Discovery is not limited to them, any name starting
+	# with CONNECTION_PREFIX is a player.
+	#
 	PLAYERS				 = ('audacious', 'vlc', 'bmp', 'xmms2')
 	CONNECTION_PREFIX    = "org.mpris.MediaPlayer2."
 	OBJECT_PATH          = "/org/mpris/MediaPlayer2"
 	INTERFACE_ROOT       = "org.mpris.MediaPlayer2"
 	INTERFACE_PLAYER     = "org.mpris.MediaPlayer2.Player"
 	INTERFACE_TRACKLIST  = "org.mpris.MediaPlayer2.TrackList"
-	INTERFACE_PLAYLISTS  = "org.mpris.MediaPlayer2.PlayLists"
+	INTERFACE_PLAYLISTS  = "org.mpris.MediaPlayer2.Playlists"
 	INTERFACE_PROPERTIES = "org.freedesktop.DBus.Properties"
+	NO_TRACK             = "/org/mpris/MediaPlayer2/TrackList/NoTrack"
 
-	def __init__(self, conn):
+	def __init__(self, conn, max_age=0, watch=False):
 		"""
 		:Parameters:
 			`conn` : string
 				one of `MPRIS.PLAYERS` or the unique name of the player
-		"""
-		bus = dbus.SessionBus()
+			`max_age` : float
+				freshness window, in seconds, of the property snapshots used
+				by the accessors of the remote objects ; 0 disables snapshots
+				and every accessor queries the player
+			`watch` : bool
+				keep the properties of `Root` and `Player` in a cache updated
+				from PropertiesChanged signals, see `Remote.watch`
+		"""
+		bus = session_bus()
 		
+		self.bus		= bus
 		self.conn		= MPRIS.CONNECTION_PREFIX + conn
 		self.icon		= conn
-		self.mpris      = bus.get_object(self.conn, MPRIS.OBJECT_PATH)
-		self.properties = dbus.Interface(self.mpris, MPRIS.INTERFACE_PROPERTIES)
-		self.root       = Root(self)
-		self.player     = Player(self)
-		self.metadata	= Metadata(self)
+		self.max_age	= max_age
+		self.watching	= watch
+		self.notifier	= None
 		
-		if self.root.HasTrackList():
+		#
+		# Without introspection, no call is made before the first method
+		# call. Methods which take arguments give their signature.
+		#
+		self.mpris      = bus.get_object(self.conn, MPRIS.OBJECT_PATH,
+			introspect=False)
+		self.properties = dbus.Interface(self.mpris, MPRIS.INTERFACE_PROPERTIES)
+	
+	def __getattr__(self, name):
+		"""
+		Create `root`, `player`, `metadata`, `tracklist`, `playlists`,
+		`identity` and `dispatcher` on first access.
+		"""
+		if name == 'root':
+			self.root = Root(self)
+			
+			if self.watching:
+				self.root.watch()
+		elif name == 'player':
+			self.player = Player(self)
+			
+			if self.watching:
+				self.player.watch()
+		elif name == 'metadata':
+			self.metadata = Metadata(self)
+		elif name == 'tracklist':
+			if not self.root.HasTrackList():
+				raise AttributeError(name)
+			
 			self.tracklist = TrackList(self)
+		elif name == 'playlists':
+			self.playlists = Playlists(self)
+		elif name == 'identity':
+			self.identity = self.root.Identity()
+		elif name == 'dispatcher':
+			self.dispatcher = SignalDispatcher(self)
+		else:
+			raise AttributeError(name)
+		
+		return self.__dict__[name]
+	
+	def notify(self, message, summary=None, icon=None):
+		"""
+		Show a desktop notification, without waiting for it to be shown, see
+		`mpris_notify.Notifier`. The summary is the identity of the player and
+		the icon is named after the player by default.
+		
+		The identity is only read from the worker thread of the notifier, so
+		that queuing the notification never waits for the player.
+		"""
+		identity = lambda: self.identity
+		
+		if self.notifier is None:
+			from mpris_notify import Notifier
 			
-		self.playlists = Playlists(self)
+			self.notifier = Notifier(identity)
 		
-		self.identity   = self.root.Identity()
+		self.notifier.notify(summary or identity, "<b>" + message + "</b>",
+			icon or self.icon)
+	
+	def notify_track(self):
+		"""
+		Show a notification of the current track, with its album art if it
+		has some, see `mpris_art`.
+		"""
+		data    = self.metadata.data
+		artists = data.get('xesam:artist')
+		art     = data.get('mpris:artUrl')
+		icon    = None
+		
+		if art:
+			def icon():
+				import mpris_art
+				
+				return mpris_art.thumbnail(art) or self.icon
 		
-		notify2.init(self.identity)
+		self.notify(data.get('xesam:title') or data.get('xesam:url') or "",
+			artists and ", ".join(artists) or None, icon)
 	
-	def notify(self, message):
-		n = notify2.Notification(self.identity, "<b>" + message + "</b>", self.icon)
-		n.show()
+	def flush_notifications(self, timeout=2):
+		"""
+		Wait for the pending notification to be shown, for at most `timeout`
+		seconds.
+		"""
+		if self.notifier is not None:
+			self.notifier.flush(timeout)
 	
 
 class Remote:
 	"""
 	Base for dbus remote objects.
 	"""
+	
+	#
+	# Properties which are not signalled by PropertiesChanged and so can not
+	# be served from the cache when watching.
+	#
+	volatile = ()
+	
 	def __init__(self, mpris, interface):
 		self.mpris  = mpris
 		self.object = dbus.Interface(mpris.mpris, interface)
 		self.interface = interface
+		self.max_age   = mpris.max_age
+		self.watching  = False
+		
+		self.snapshot_data = None
+		self.snapshot_time = 0
+
+	def snapshot(self, max_age=None):
+		"""
+		Get all the properties of the interface, using a single GetAll call.
+		
+		The result is kept and served again as long as it is not older than
+		`max_age` seconds.
+		
+		:Parameters:
+			`max_age` : float
+				freshness window in seconds, defaults to the one given to
+				`MPRIS` ; 0 forces a new GetAll call
+		"""
+		if max_age is None:
+			max_age = self.max_age
+		
+		now = time.time()
+		
+		if self.snapshot_data is None or \
+				(not self.watching and now - self.snapshot_time >= max_age):
+			self.snapshot_data = self.mpris.properties.GetAll(self.interface)
+			self.snapshot_time = now
+		
+		return self.snapshot_data
+	
+	def invalidate(self):
+		"""
+		Drop the current snapshot, next access will fetch a new one.
+		"""
+		self.snapshot_data = None
+	
+	def watch(self):
+		"""
+		Turn the snapshot of the interface into a cache kept up to date from
+		the PropertiesChanged signal. The cache is filled once, then patched
+		with the changed properties carried by the signal. Invalidated
+		properties are dropped and fetched again, one by one, on their next
+		access.
+		
+		Signals are only received while a main loop is running.
+		"""
+		if self.watching:
+			return
+		
+		self.on_PropertiesChanged(self.properties_changed)
+		self.snapshot(0)
+		self.watching = True
+	
+	def properties_changed(self, interface, changed, invalidated):
+		"""
+		Handler of the PropertiesChanged signal used by `watch`.
+		"""
+		if self.snapshot_data is None:
+			return
+		
+		self.snapshot_data.update(changed)
+		
+		for prop in invalidated:
+			self.snapshot_data.pop(prop, None)
 
 	def get(self, property, convert=True):
 		"""
 		Get a property.
 		
+		If the interface is watched or if a freshness window is set, the
+		value is taken from the snapshot of the interface. Properties
+		missing from the snapshot are queried individually, and kept in the
+		cache when watching.
+		
 		:Parameters:
 			`property` : string
 				name of the property
 			`convert` : bool
-				convert value from dbus type to standard python type
+				convert value from dbus type to standard python type, see
+				`convert_value`
 		"""
-		got = self.mpris.properties.Get(self.interface, property)
+		got = None
+		
+		if self.watching:
+			if property not in self.volatile:
+				got = self.snapshot().get(property)
+		elif self.max_age > 0:
+			got = self.snapshot().get(property)
+		
+		if got is None:
+			got = self.mpris.properties.Get(self.interface, property)
+			
+			if self.watching and property not in self.volatile:
+				self.snapshot_data[property] = got
 		
 		if convert:
-			if type(got) is dbus.String:
-				return got.encode('utf-8')
+			return convert_value(got)
 		
 		return got
 
@@ -128,13 +754,420 @@ class Remote:
 		
 		"""
 		self.mpris.properties.Set(self.interface, prop, value)
+		
+		if self.snapshot_data is not None:
+			self.snapshot_data.pop(prop, None)
+	
+	def connect(self, signal, handler, **options):
+		"""
+		Call `handler` with the arguments of each emission of `signal`, see
+		`SignalDispatcher`. The `on_*` methods take the same options.
+		
+		:Parameters:
+			`debounce` : float
+				call the handler once no signal was received for this time,
+				in seconds
+			`throttle` : float
+				call the handler at most this number of times per second
+			`latest` : bool
+				call the handler once for the signals received during an
+				iteration of the main loop
+		
+		:return: the `Subscription`, removed with its `remove` method
+		"""
+		return self.mpris.dispatcher.connect(self.interface, signal, handler,
+			**options)
+	
+	def submit(self, batch, method, signature=None, args=()):
+		"""
+		Send a method call of the interface through a `Batch`, without
+		waiting for the reply.
+		
+		:return: the `Reply` of the call
+		"""
+		return batch.call(self.mpris.conn, MPRIS.OBJECT_PATH, self.interface,
+			method, signature, args)
 	
-	def connect(self, signal, handler):
+	def submit_set(self, batch, prop, value):
 		"""
+		Set a property through a `Batch`, without waiting for the reply.
+		
+		:return: the `Reply` of the call
+		"""
+		if self.snapshot_data is not None:
+			self.snapshot_data.pop(prop, None)
+		
+		return batch.call(self.mpris.conn, MPRIS.OBJECT_PATH,
+			MPRIS.INTERFACE_PROPERTIES, "Set", "ssv", (self.interface, prop, value))
+	
+	def on_PropertiesChanged(self, handler, keys=None, **options):
+		"""
+		Properties of this interface have changed. If `keys` is given,
+		`handler` is only called when one of these properties is changed or
+		invalidated. See `connect` for the options.
+		
+		:Parameters:
+			`Interface` — s
+				Name of this interface.
+			`Changed_properties` — a{sv}
+				Changed properties with their new values.
+			`Invalidated_properties` — as
+				Changed properties whose new value is not sent.
 		"""
-		self.object.connect_to_signal(signal, handler)
+		return self.mpris.dispatcher.connect(self.interface, 'PropertiesChanged',
+			handler, keys, **options)
 
 
+class SignalDispatcher:
+	"""
+	Receives the signals of a player and calls the handlers subscribed to
+	them.
+	
+	A single match rule is added per interface emitting signals, whatever
+	the number of handlers, and signals are dispatched from a single
+	callback. PropertiesChanged is dispatched on the interface whose
+	properties changed, optionally filtered on the names of the properties.
+	A handler raising an exception does not prevent the other ones from
+	being called, the traceback is printed on stderr.
+	
+	Each subscription may delay and merge the signals given to its handler,
+	see `Subscription`, so that a slow handler does not fall behind a player
+	emitting many signals.
+	
+	Signals are only received while a main loop is running.
+	"""
+	
+	def __init__(self, mpris):
+		"""
+		:Parameters:
+			`mpris` : MPRIS
+				player whose signals are dispatched
+		"""
+		self.mpris         = mpris
+		self.receivers     = {}
+		self.subscriptions = {}
+	
+	def connect(self, interface, signal, handler, keys=None, **options):
+		"""
+		Call `handler` with the arguments of each emission of a signal. The
+		options are the ones of `Subscription`.
+		
+		:Parameters:
+			`interface` : string
+				interface of the signal, or whose properties are watched for
+				PropertiesChanged
+			`signal` : string
+				name of the signal
+			`handler` : callable
+				called with the arguments of the signal
+			`keys` : list
+				names of the properties, for PropertiesChanged only ; the
+				handler is called when one of them is changed or invalidated,
+				for all the changes if None
+		
+		:return: the `Subscription`
+		"""
+		if signal == 'PropertiesChanged':
+			emitter = MPRIS.INTERFACE_PROPERTIES
+		else:
+			emitter = interface
+		
+		if emitter not in self.receivers:
+			self.receivers[emitter] = self.mpris.bus.add_signal_receiver(
+				self.received, dbus_interface=emitter, bus_name=self.mpris.conn,
+				path=MPRIS.OBJECT_PATH, member_keyword='member',
+				interface_keyword='interface')
+		
+		subscription = Subscription(self, (interface, signal), emitter,
+			handler, keys, **options)
+		
+		self.subscriptions.setdefault(subscription.key, []).append(subscription)
+		
+		return subscription
+	
+	def disconnect(self, subscription):
+		"""
+		Remove a subscription, the match rule of its interface is removed
+		with the last subscription using it.
+		"""
+		subscriptions = self.subscriptions.get(subscription.key, [])
+		
+		if subscription not in subscriptions:
+			return
+		
+		subscriptions.remove(subscription)
+		subscription.cancel()
+		
+		if not subscriptions:
+			del self.subscriptions[subscription.key]
+		
+		for other in self.subscriptions.itervalues():
+			if other[0].emitter == subscription.emitter:
+				return
+		
+		self.receivers.pop(subscription.emitter).remove()
+	
+	def received(self, *args, **keywords):
+		"""
+		Callback of all the signals.
+		"""
+		member    = keywords['member']
+		interface = keywords['interface']
+		changed   = None
+		
+		if member == 'PropertiesChanged' and \
+				interface == MPRIS.INTERFACE_PROPERTIES:
+			interface = args[0]
+			changed   = set(args[1])
+			
+			if len(args) > 2:
+				changed.update(args[2])
+		
+		for subscription in list(self.subscriptions.get((interface, member), ())):
+			if changed is not None and subscription.keys is not None and \
+					changed.isdisjoint(subscription.keys):
+				continue
+			
+			subscription.received(args)
+	
+	def call(self, subscription, args):
+		"""
+		Call the handler of a subscription, printing its errors.
+		"""
+		try:
+			subscription.handler(*args)
+		except Exception:
+			print >>sys.stderr, "error in handler of %s.%s:" % subscription.key
+			traceback.print_exc()
+
+class Subscription:
+	"""
+	Handler subscribed to a signal through a `SignalDispatcher`.
+	
+	Signals may be held back and merged, with at most one of these options :
+	
+	- `debounce` : the handler is called once no signal was received for
+	  `debounce` seconds ;
+	- `throttle` : the handler is called at most `throttle` times per
+	  second, signals received in between are delivered at the end of the
+	  interval ;
+	- `latest` : the handler is called from the next idle iteration of the
+	  main loop, once for all the signals received until then.
+	
+	Only the arguments of the last signal held back are given to the
+	handler, except for PropertiesChanged whose changed and invalidated
+	properties are merged.
+	"""
+	def __init__(self, dispatcher, key, emitter, handler, keys=None,
+			debounce=None, throttle=None, latest=False):
+		self.dispatcher = dispatcher
+		self.key        = key
+		self.emitter    = emitter
+		self.handler    = handler
+		self.keys       = keys is not None and frozenset(keys) or None
+		self.debounce   = debounce
+		self.throttle   = throttle
+		self.latest     = latest
+		self.pending    = None
+		self.source     = None
+		self.last       = 0
+		
+		if len([option for option in (debounce, throttle, latest) if option]) > 1:
+			raise ValueError("debounce, throttle and latest are exclusive")
+	
+	def remove(self):
+		"""
+		Stop calling the handler, signals held back are dropped.
+		"""
+		self.dispatcher.disconnect(self)
+	
+	def received(self, args):
+		"""
+		Deliver or hold back the arguments of a signal.
+		"""
+		if not (self.debounce or self.throttle or self.latest):
+			self.dispatcher.call(self, args)
+			return
+		
+		gobject = mainloop()
+		
+		if self.pending is not None and self.key[1] == 'PropertiesChanged':
+			changed = dict(self.pending[1])
+			changed.update(args[1])
+			
+			invalidated = [name for name in self.pending[2] if name not in changed]
+			invalidated.extend(name for name in args[2] if name not in invalidated)
+			
+			for name in args[2]:
+				changed.pop(name, None)
+			
+			args = (args[0], changed, invalidated)
+		
+		self.pending = args
+		
+		if self.debounce:
+			if self.source is not None:
+				gobject.source_remove(self.source)
+			
+			self.source = gobject.timeout_add(int(self.debounce * 1000),
+				self.flush)
+		elif self.source is not None:
+			return
+		elif self.throttle:
+			wait = self.last + 1.0 / self.throttle - monotonic()
+			
+			if wait <= 0:
+				self.flush()
+			else:
+				self.source = gobject.timeout_add(int(wait * 1000), self.flush)
+		else:
+			self.source = gobject.idle_add(self.flush)
+	
+	def flush(self):
+		"""
+		Call the handler with the signal held back, if any.
+		"""
+		args, self.pending = self.pending, None
+		self.source = None
+		self.last   = monotonic()
+		
+		if args is not None:
+			self.dispatcher.call(self, args)
+		
+		return False
+	
+	def cancel(self):
+		"""
+		Drop the signal held back.
+		"""
+		if self.source is not None:
+			mainloop().source_remove(self.source)
+		
+		self.pending = None
+		self.source  = None
+
+class Reply:
+	"""
+	Reply to a method call sent by `Batch`.
+	"""
+	def __init__(self):
+		self.pending = None
+		self.done    = False
+		self.args    = None
+		self.error   = None
+		self.sent    = time.time()
+		self.time    = None
+	
+	def handle(self, message):
+		"""
+		Called by dbus when the reply message is received.
+		"""
+		if isinstance(message, dbus.lowlevel.ErrorMessage):
+			self.error = dbus.DBusException(*message.get_args_list(),
+				name=message.get_error_name())
+		else:
+			self.args = message.get_args_list()
+		
+		self.done = True
+		self.time = time.time()
+	
+	def wait(self):
+		"""
+		Wait for the reply and return its value : None if the method returns
+		nothing, the value if it returns one, a tuple otherwise. Errors are
+		raised as `dbus.DBusException`.
+		"""
+		if not self.done:
+			self.pending.block()
+		
+		if not self.done:
+			raise dbus.DBusException("no reply received")
+		
+		if self.error is not None:
+			raise self.error
+		
+		if len(self.args) == 0:
+			return None
+		elif len(self.args) == 1:
+			return self.args[0]
+		else:
+			return tuple(self.args)
+
+class Batch:
+	"""
+	Sends method calls without waiting for their replies, so that many calls
+	are in flight at once on the connection. Replies are collected later
+	with `Reply.wait`. No main loop is needed.
+	"""
+	def __init__(self, bus=None, window=None, timeout=-1):
+		"""
+		:Parameters:
+			`bus` : dbus.Bus
+				connection used, defaults to the session bus
+			`window` : int
+				maximum number of calls in flight, None for no limit
+			`timeout` : float
+				timeout of each call in seconds, -1 for the dbus default
+		"""
+		self.bus     = bus or session_bus()
+		self.window  = window
+		self.timeout = timeout
+		self.pending = collections.deque()
+	
+	def call(self, name, path, interface, method, signature=None, args=()):
+		"""
+		Send a method call. If the window is full, wait for the oldest
+		call first.
+		
+		:Parameters:
+			`name` : string
+				bus name of the destination
+			`path` : string
+				object path
+			`interface` : string
+				interface of the method
+			`method` : string
+				method name
+			`signature` : string
+				signature of the arguments
+			`args` : tuple
+				arguments of the method
+		
+		:return: the `Reply` of the call
+		"""
+		while self.pending and self.pending[0].done:
+			self.pending.popleft()
+		
+		if self.window is not None:
+			while len(self.pending) >= self.window:
+				reply = self.pending.popleft()
+				
+				if not reply.done:
+					reply.pending.block()
+		
+		message = dbus.lowlevel.MethodCallMessage(name, path, interface, method)
+		
+		if args:
+			message.append(signature=signature, *args)
+		
+		reply = Reply()
+		reply.pending = self.bus.send_message_with_reply(message, reply.handle,
+			self.timeout, require_main_loop=False)
+		
+		self.pending.append(reply)
+		
+		return reply
+	
+	def wait(self):
+		"""
+		Wait for all the calls in flight.
+		"""
+		while self.pending:
+			reply = self.pending.popleft()
+			
+			if not reply.done:
+				reply.pending.block()
+
 class Root(Remote):
 	"""
 	Bindings to MPRIS methods for the root interface.
@@ -378,8 +1411,29 @@ class Player(Remote):
 	- CanControl	 	b						Read only
 	"""
 	
+	volatile = ('Position',)
+	
 	def __init__(self, mpris):
 		Remote.__init__(self, mpris, MPRIS.INTERFACE_PLAYER)
+		
+		self.position_clock = None
+	
+	def clock(self, max_drift=None):
+		"""
+		Get the `PositionClock` of this player, it is created on the first
+		call.
+		
+		:Parameters:
+			`max_drift` : int
+				see `PositionClock`
+		"""
+		if self.position_clock is None:
+			self.position_clock = PositionClock(self)
+		
+		if max_drift is not None:
+			self.position_clock.max_drift = max_drift
+		
+		return self.position_clock
 	
 	def Next(self):
 		"""
@@ -461,7 +1515,7 @@ class Player(Remote):
 		- Offset — x (Time_In_Us) : The number of microseconds to seek
 		  forward.
 		"""
-		self.object.Seek(offset)
+		self.object.Seek(offset, signature='x')
 	
 	def SetPosition(self, track_id, position):
 		"""
@@ -480,7 +1534,7 @@ class Player(Remote):
 		- Position — x (Time_In_Us) : Track position in microseconds. This
 		  must be between 0 and <track_length>.
 		"""
-		self.object.SetPosition(track_id, position)
+		self.object.SetPosition(track_id, position, signature='ox')
 	
 	def OpenUri(self, uri):
 		"""
@@ -507,7 +1561,7 @@ class Player(Remote):
 		  property and the mime-type should match one of the elements of
 		  the org.mpris.MediaPlayer2.SupportedMimeTypes.
 		"""
-		self.object.OpenUri(uri)
+		self.object.OpenUri(uri, signature='s')
 	
 	def PlaybackStatus(self):
 		"""
@@ -801,56 +1855,528 @@ class Player(Remote):
 		"""
 		return self.get("CanControl")
 	
-	def on_Seeked(self, handler):
+	def on_Seeked(self, handler, **options):
+		"""
+		Indicates that the track position has changed in a way that is
+		inconsistant with the current playing state.
+		
+		When this signal is not received, clients should assume that:
+			- When playing, the position progresses according to the rate
+			property.
+			- When paused, it remains constant.
+			
+		This signal does not need to be emitted when playback starts or when
+		the track changes, unless the track is starting at an unexpected
+		position. An expected position would be the last known one when going
+		from Paused to Playing, and 0 when going from Stopped to Playing.
+
+		:Parameters:
+			`Position` — x (Time_In_Us)
+				The new position, in microseconds.
+		"""
+		return self.connect('Seeked', handler, **options)
+
+def monotonic():
+	"""
+	Time in seconds from an arbitrary origin, which does not follow the
+	steps of the system clock. On Linux, os.times gives the real time
+	elapsed since boot, with the resolution of the clock tick.
+	"""
+	return os.times()[4]
+
+class PositionClock:
+	"""
+	Local clock giving the position of the current track without querying
+	the player, since Position is not signalled.
+	
+	The position is sampled once, with the playback status and the rate,
+	then extrapolated from the time elapsed since the sample. A new sample
+	is taken on the Seeked signal, when the playback status, the rate or
+	the current track change, and when the estimation may have drifted by
+	more than `max_drift`.
+	
+	Elapsed time is measured with `monotonic`, so that steps of the system
+	clock do not move the estimated position.
+	"""
+	
+	def __init__(self, player, max_drift=50000, drift_rate=0.001):
+		"""
+		:Parameters:
+			`player` : Player
+				player whose position is estimated
+			`max_drift` : int
+				maximum drift of the estimation, in microseconds
+			`drift_rate` : float
+				assumed drift between the local clock and the player, in
+				microseconds per elapsed microsecond
+		"""
+		self.player     = player
+		self.max_drift  = max_drift
+		self.drift_rate = drift_rate
+		
+		self.sample  = None
+		self.time    = 0
+		self.rate    = 1.0
+		self.status  = "Stopped"
+		self.trackid = None
+		
+		player.on_Seeked(self.seeked)
+		player.on_PropertiesChanged(self.properties_changed)
+	
+	def resync(self):
+		"""
+		Sample the position again on next read.
+		"""
+		self.sample = None
+	
+	def sync(self):
+		"""
+		Sample the position, the playback status and the rate.
+		"""
+		self.status  = self.player.PlaybackStatus()
+		self.rate    = float(self.player.Rate())
+		self.sample  = int(self.player.Position())
+		self.time    = monotonic()
+		self.trackid = self.player.mpris.metadata.data.get('mpris:trackid')
+	
+	def seeked(self, position):
+		"""
+		Handler of the Seeked signal, which gives the new position.
+		"""
+		if self.sample is not None:
+			self.sample = int(position)
+			self.time   = monotonic()
+	
+	def properties_changed(self, interface, changed, invalidated):
+		"""
+		Handler of the PropertiesChanged signal of the player.
+		"""
+		if 'PlaybackStatus' in changed or 'Rate' in changed or \
+				'PlaybackStatus' in invalidated or 'Rate' in invalidated or \
+				'Metadata' in invalidated:
+			self.resync()
+		elif 'Metadata' in changed:
+			if changed['Metadata'].get('mpris:trackid') != self.trackid:
+				self.resync()
+	
+	def position(self):
+		"""
+		The estimated position of the current track in microseconds.
+		"""
+		now = monotonic()
+		
+		if self.sample is None or now < self.time or \
+				(now - self.time) * 1000000 * self.drift_rate > self.max_drift:
+			self.sync()
+			now = self.time
+		
+		if self.status != "Playing":
+			return self.sample
+		
+		position = self.sample + int((now - self.time) * 1000000 * self.rate)
+		length   = self.player.mpris.metadata.data.get('mpris:length')
+		
+		if length is not None and position > length:
+			position = int(length)
+		
+		return max(position, 0)
+
+class TrackList(Remote):
+	"""
+	Bindings to MPRIS methods for the tracklist interface.
+	Documentation from <http://specifications.freedesktop.org/mpris-spec/>
+	
+	Methods :
+	- GetTracksMetadata	(ao: TrackIds)								:	aa{sv}: Metadata	
+	- AddTrack			(s: Uri, o: AfterTrack, b: SetAsCurrent)	:	nothing	
+	- RemoveTrack		(o: TrackId)								:	nothing	
+	- GoTo				(o: TrackId)								:	nothing	
+
+	Signals :
+	- TrackListReplaced		(ao: Tracks, o: CurrentTrack)	
+	- TrackAdded			(a{sv}: Metadata, o: AfterTrack)	
+	- TrackRemoved			(o: TrackId)	
+	- TrackMetadataChanged	(o: TrackId, a{sv}: Metadata)	
+
+	Properties :
+	- Tracks	 		ao (Track_Id_List)	Read only		
+	- CanEditTracks		b					Read only
+		
+	Types :
+	- Uri			Simple Type	s	
+	- Metadata_Map	Mapping	a{sv}	
+	"""
+	
+	def __init__(self, mpris):
+		Remote.__init__(self, mpris, MPRIS.INTERFACE_TRACKLIST)
+		
+		self.tracklist_mirror = None
+		self.tracks_metadata  = None
+		self.track_index      = None
+	
+	def metadata_cache(self):
+		"""
+		Get the `MetadataCache` used by `fetch_metadata`, it is created on
+		the first call. Entries are dropped when the metadata of the track
+		change, when the track is removed and when the tracklist is
+		replaced.
+		"""
+		if self.tracks_metadata is None:
+			self.tracks_metadata = MetadataCache()
+			
+			self.on_TrackMetadataChanged(self.tracks_metadata.track_changed)
+			self.on_TrackRemoved(self.tracks_metadata.discard)
+			self.on_TrackListReplaced(self.tracks_metadata.tracklist_replaced)
+		
+		return self.tracks_metadata
+	
+	def fetch_metadata(self, track_ids, chunk_size=500, window=4):
+		"""
+		Get the metadata of a set of tracks, using the `MetadataCache`.
+		
+		Tracks missing from the cache are requested with GetTracksMetadata
+		by chunks of `chunk_size` ids, with `window` requests in flight,
+		instead of a single message which some players fail to answer in
+		time for long lists.
+		
+		:Parameters:
+			`track_ids` : list
+				ids of the tracks
+			`chunk_size` : int
+				number of ids per request
+			`window` : int
+				maximum number of requests in flight
+		
+		:return: `Track` records, in the order of `track_ids` ; None for the
+			tracks the player gave no metadata for
+		"""
+		cache   = self.metadata_cache()
+		found   = {}
+		missing = []
+		
+		#
+		# The hits are read before anything is put in the cache, fetched
+		# records could evict them otherwise.
+		#
+		for track_id in track_ids:
+			if track_id in found:
+				continue
+			
+			found[track_id] = cache.get(track_id)
+			
+			if found[track_id] is None:
+				missing.append(track_id)
+		
+		batch   = Batch(self.mpris.bus, window)
+		replies = []
+		
+		for i in xrange(0, len(missing), chunk_size):
+			replies.append(self.submit(batch, "GetTracksMetadata", "ao",
+				(missing[i:i + chunk_size],)))
+		
+		for reply in replies:
+			for metadata in reply.wait():
+				track = Track(metadata)
+				found[track.trackid] = track
+				cache.put(track.trackid, track)
+		
+		return [found[track_id] for track_id in track_ids]
+	
+	def iter_metadata(self, track_ids=None, page_size=500, prefetch=1):
+		"""
+		Iterate over the metadata of tracks, as `Track` records, page by page
+		as they arrive.
+		
+		While a page is being iterated, the next `prefetch` pages are
+		already requested. Only these pages are held in memory, whatever the
+		length of the tracklist, and nothing is put in the cache.
+		
+		:Parameters:
+			`track_ids` : list
+				ids of the tracks, defaults to the whole tracklist, taken from
+				the mirror if there is one
+			`page_size` : int
+				number of tracks requested at once
+			`prefetch` : int
+				number of pages requested ahead
+		"""
+		if track_ids is None:
+			if self.tracklist_mirror is not None:
+				track_ids = self.mirror().tracks()
+			else:
+				track_ids = self.Tracks()
+		
+		batch   = Batch(self.mpris.bus)
+		pending = collections.deque()
+		
+		for i in xrange(0, len(track_ids), page_size):
+			pending.append(self.submit(batch, "GetTracksMetadata", "ao",
+				(track_ids[i:i + page_size],)))
+			
+			if len(pending) > prefetch:
+				for metadata in pending.popleft().wait():
+					yield Track(metadata)
+		
+		while pending:
+			for metadata in pending.popleft().wait():
+				yield Track(metadata)
+	
+	def mirror(self):
+		"""
+		Get the `TrackListMirror` of this tracklist, it is created and filled
+		on the first call, and filled again if it missed a signal.
+		"""
+		if self.tracklist_mirror is None:
+			self.tracklist_mirror = TrackListMirror(self)
+		else:
+			self.tracklist_mirror.sync()
+		
+		return self.tracklist_mirror
+	
+	def index(self):
+		"""
+		Get the `TrackIndex` of this tracklist, it is created on the first
+		call and built on the first search.
+		"""
+		if self.track_index is None:
+			self.track_index = TrackIndex(self)
+		
+		return self.track_index
+
+	def supported(self, uris):
+		"""
+		Split URIs between the ones the player claims to support, from its
+		SupportedUriSchemes and SupportedMimeTypes, and the others. The mime
+		type is guessed from the extension ; URIs whose type is unknown are
+		accepted.
+		
+		:return: a tuple (accepted, rejected) of lists of URIs
+		"""
+		schemes  = set(self.mpris.root.SupportedUriSchemes())
+		types    = set(self.mpris.root.SupportedMimeTypes())
+		accepted = []
+		rejected = []
+		
+		for uri in uris:
+			scheme = uri.partition(':')[0].lower()
+			mime   = mimetypes.guess_type(uri)[0]
+			
+			if scheme in schemes and (mime is None or not types or mime in types):
+				accepted.append(uri)
+			else:
+				rejected.append(uri)
+		
+		return accepted, rejected
+	
+	def add_tracks(self, uris, after_track=None, window=32, timeout=25):
+		"""
+		Add many URIs to the tracklist, in order.
+		
+		AddTrack calls are sent by windows of `window` URIs without waiting
+		for each reply. Inside a window, the URIs are added in reverse order
+		after the same track, so that they end up in order. The track after
+		which the next window is added is the last one of the window, known
+		from its TrackAdded signal, matched by its xesam:url or else by the
+		order of the signals. The main loop is run while waiting for them.
+		
+		URIs whose AddTrack call fails are skipped, without waiting for
+		their signal.
+		
+		:Parameters:
+			`uris` : list
+				URIs to add, see `supported`
+			`after_track` : string
+				id of the track after which the URIs are added, the end of
+				the tracklist by default
+			`window` : int
+				number of AddTrack calls in flight
+			`timeout` : float
+				maximum time to wait for the signals of a window, in seconds
+		
+		:return: ids of the added tracks, in the order of `uris` ; None for
+			the URIs the player refused
+		:raise RuntimeError: if the tracklist can not be edited, or if
+			signals are missing
+		"""
+		if not self.CanEditTracks():
+			raise RuntimeError("the tracklist can not be edited")
+		
+		if after_track is None:
+			after_track = self.mirror().last or MPRIS.NO_TRACK
+		
+		batch = Batch(self.mpris.bus)
+		acks  = []
+		added = []
+		match = self.connect('TrackAdded',
+			lambda metadata, after: acks.append((metadata, after)))
+		
+		try:
+			for i in xrange(0, len(uris), window):
+				chunk   = uris[i:i + window]
+				replies = []
+				
+				for uri in reversed(chunk):
+					replies.append((uri, self.submit(batch, "AddTrack", "sob",
+						(uri, after_track, False))))
+				
+				batch.wait()
+				
+				refused = collections.Counter()
+				
+				for uri, reply in replies:
+					try:
+						reply.wait()
+					except dbus.DBusException:
+						refused[uri] += 1
+				
+				accepted = collections.Counter(chunk) - refused
+				expected = sum(accepted.values())
+				
+				#
+				# Ids of the tracks of each URI, in the order of the tracklist,
+				# and ids of the tracks whose URI is not known.
+				#
+				matched = {}
+				ordered = []
+				
+				def acknowledged():
+					while acks:
+						metadata, after = acks.pop(0)
+						url      = convert_value(metadata.get('xesam:url'))
+						track_id = str(metadata['mpris:trackid'])
+						ids      = matched.setdefault(url, [])
+						
+						#
+						# Signals come in the order of the calls, the reverse of
+						# the order in the tracklist.
+						#
+						if len(ids) < accepted[url]:
+							ids.insert(0, track_id)
+						elif after == after_track:
+							ordered.insert(0, track_id)
+					
+					found = sum(len(ids) for ids in matched.itervalues())
+					
+					return found + len(ordered) >= expected
+				
+				if not iterate_until(acknowledged, timeout):
+					raise RuntimeError("missing TrackAdded signals for %d track(s)" % \
+						(expected - len(ordered) - \
+							sum(len(ids) for ids in matched.itervalues())))
+				
+				#
+				# Refused URIs come last among the duplicates of a window.
+				#
+				for uri in chunk:
+					if accepted[uri] > 0:
+						accepted[uri] -= 1
+						ids = matched.get(uri)
+						added.append(ids and ids.pop(0) or ordered.pop(0))
+						after_track = added[-1]
+					else:
+						added.append(None)
+		finally:
+			match.remove()
+		
+		return added
+	
+	def remove_tracks(self, track_ids, window=64, timeout=25):
+		"""
+		Remove many tracks from the tracklist.
+		
+		RemoveTrack calls are sent with `window` of them in flight. Removals
+		are confirmed from the TrackRemoved and TrackListReplaced signals,
+		running the main loop until all of them are, or until `timeout`.
+		Tracks missing from the `TrackListMirror` are ignored, tracks whose
+		RemoveTrack call fails are not waited for.
+		
+		:Parameters:
+			`track_ids` : list
+				ids of the tracks to remove
+			`window` : int
+				number of RemoveTrack calls in flight
+			`timeout` : float
+				maximum time to wait for the signals, in seconds
+		
+		:return: a tuple (removed, failed) of the ids of the tracks whose
+			removal was confirmed, and of the other ones
+		:raise RuntimeError: if the tracklist can not be edited
+		"""
+		if not self.CanEditTracks():
+			raise RuntimeError("the tracklist can not be edited")
+		
+		mirror    = self.mirror()
+		track_ids = [str(track_id) for track_id in track_ids if track_id in mirror]
+		pending   = set(track_ids)
+		removed   = set()
+		
+		def track_removed(track_id):
+			if track_id in pending:
+				removed.add(str(track_id))
+		
+		def tracklist_replaced(tracks, current=None):
+			removed.update(pending.difference(str(track_id) for track_id in tracks))
+		
+		matches = [self.connect('TrackRemoved', track_removed),
+			self.connect('TrackListReplaced', tracklist_replaced)]
+		
+		try:
+			batch   = Batch(self.mpris.bus, window)
+			replies = []
+			
+			for track_id in track_ids:
+				replies.append((track_id,
+					self.submit(batch, "RemoveTrack", "o", (track_id,))))
+			
+			batch.wait()
+			
+			for track_id, reply in replies:
+				try:
+					reply.wait()
+				except dbus.DBusException:
+					pending.discard(track_id)
+			
+			iterate_until(lambda: len(removed & pending) == len(pending), timeout)
+		finally:
+			for match in matches:
+				match.remove()
+		
+		return [track_id for track_id in track_ids if track_id in removed], \
+			[track_id for track_id in track_ids if track_id not in removed]
+	
+	def remove_duplicates(self):
 		"""
-		Indicates that the track position has changed in a way that is
-		inconsistant with the current playing state.
+		Remove the tracks whose xesam:url is the same as the one of a track
+		before them in the tracklist.
 		
-		When this signal is not received, clients should assume that:
-			- When playing, the position progresses according to the rate
-			property.
-			- When paused, it remains constant.
-			
-		This signal does not need to be emitted when playback starts or when
-		the track changes, unless the track is starting at an unexpected
-		position. An expected position would be the last known one when going
-		from Paused to Playing, and 0 when going from Stopped to Playing.
-
-		:Parameters:
-			`Position` — x (Time_In_Us)
-				The new position, in microseconds.
+		:return: see `remove_tracks`
 		"""
-		self.connect('Seeked', handler)
-
-class TrackList(Remote):
-	"""
-	Bindings to MPRIS methods for the tracklist interface.
-	Documentation from <http://specifications.freedesktop.org/mpris-spec/>
+		tracks     = self.mirror().tracks()
+		seen       = set()
+		duplicates = []
+		
+		for track in self.fetch_metadata(tracks):
+			if track is None or track.url is None:
+				continue
+			
+			if track.url in seen:
+				duplicates.append(track.trackid)
+			else:
+				seen.add(track.url)
+		
+		return self.remove_tracks(duplicates)
 	
-	Methods :
-	- GetTracksMetadata	(ao: TrackIds)								:	aa{sv}: Metadata	
-	- AddTrack			(s: Uri, o: AfterTrack, b: SetAsCurrent)	:	nothing	
-	- RemoveTrack		(o: TrackId)								:	nothing	
-	- GoTo				(o: TrackId)								:	nothing	
-
-	Signals :
-	- TrackListReplaced		(ao: Tracks, o: CurrentTrack)	
-	- TrackAdded			(a{sv}: Metadata, o: AfterTrack)	
-	- TrackRemoved			(o: TrackId)	
-	- TrackMetadataChanged	(o: TrackId, a{sv}: Metadata)	
-
-	Properties :
-	- Tracks	 		ao (Track_Id_List)	Read only		
-	- CanEditTracks		b					Read only
+	def trim(self, count):
+		"""
+		Remove tracks from the start of the tracklist, keeping the last
+		`count` ones.
 		
-	Types :
-	- Uri			Simple Type	s	
-	- Metadata_Map	Mapping	a{sv}	
-	"""
+		:return: see `remove_tracks`
+		"""
+		tracks = self.mirror().tracks()
+		
+		return self.remove_tracks(tracks[:max(len(tracks) - count, 0)])
 	
-	def __init__(self, mpris):
-		Remote.__init__(self, mpris, MPRIS.INTERFACE_TRACKLIST)
-
 	def GetTracksMetadata(self, track_ids):
 		"""
 		Gets all the metadata available for a set of tracks.
@@ -868,7 +2394,7 @@ class TrackList(Remote):
 		  tracks given as input. See the type documentation for more
 		  details.
 		"""
-		return self.object.GetTracksMetadata(track_ids)
+		return self.object.GetTracksMetadata(track_ids, signature='ao')
 	
 	def AddTrack(self, uri, after_track, set_as_current):
 		"""
@@ -893,7 +2419,8 @@ class TrackList(Remote):
 		  considered as the current track. Setting this to true has the
 		  same effect as calling GoTo afterwards.
 		"""
-		self.object.AddTrack(uri, after_track, set_as_current)
+		self.object.AddTrack(uri, after_track, set_as_current,
+			signature='sob')
 	
 	def RemoveTrack(self, track_id):
 		"""
@@ -911,7 +2438,7 @@ class TrackList(Remote):
 		  /org/mpris/MediaPlayer2/TrackList/NoTrack is not a valid value
 		  for this argument.
 		"""
-		self.object.RemoveTrack(track_id)
+		self.object.RemoveTrack(track_id, signature='o')
 	
 	def GoTo(self, track_id):
 		"""
@@ -928,7 +2455,7 @@ class TrackList(Remote):
 		  /org/mpris/MediaPlayer2/TrackList/NoTrack is not a valid value
 		  for this argument.
 		"""
-		self.object.GoTo(track_id)
+		self.object.GoTo(track_id, signature='o')
 	
 	def Tracks(self):
 		"""
@@ -949,89 +2476,530 @@ class TrackList(Remote):
 		"""
 		return self.get("Tracks")
 	
-	def CanEditTracks(self):
+	def CanEditTracks(self):
+		"""
+		If false, calling AddTrack or RemoveTrack will have no effect, and
+		may raise a NotSupported error.
+
+		When this property changes, the
+		org.freedesktop.DBus.Properties.PropertiesChanged signal is emitted
+		with the new value.
+
+		Read only
+		"""
+		return self.get("CanEditTracks")
+	
+	def on_TrackListReplaced(self, handler, **options):
+		"""
+		Indicates that the entire tracklist has been replaced.
+		
+		It is left up to the implementation to decide when a change to the track
+		list is invasive enough that this signal should be emitted instead of a
+		series of TrackAdded and TrackRemoved signals.
+
+		:Parameters:
+			`Tracks` — ao (Track_Id_List)
+				The new content of the tracklist.
+			`CurrentTrack` — o (Track_Id)
+				The identifier of the track to be considered as current.
+				/org/mpris/MediaPlayer2/TrackList/NoTrack indicates that there
+				is no current track. This should correspond to the
+				mpris:trackid field of the Metadata property of the
+				org.mpris.MediaPlayer2.Player interface.
+		"""
+		return self.connect('TrackListReplaced', handler, **options)
+	
+	def on_TrackAdded(self, handler, **options):
+		"""
+		Indicates that a track has been added to the track list.
+	
+		:Parameters:
+			`Metadata` — a{sv} (Metadata_Map)
+				The metadata of the newly added item.
+				This must include a mpris:trackid entry.
+				See the type documentation for more details.
+			`AfterTrack` — o (Track_Id)
+				The identifier of the track after which the new track was
+				inserted. The path /org/mpris/MediaPlayer2/TrackList/NoTrack
+				indicates that the track was inserted at the start of the track
+				list.
+		"""
+		return self.connect('TrackAdded', handler, **options)
+	
+	def on_TrackRemoved(self, handler, **options):
+		"""
+		Indicates that a track has been removed from the track list.
+
+		:Parameters:
+			`TrackId` — o (Track_Id)
+				The identifier of the track being removed.
+				/org/mpris/MediaPlayer2/TrackList/NoTrack is not a valid value
+				for this argument.
+		"""
+		return self.connect('TrackRemoved', handler, **options)
+	
+	def on_TrackMetadataChanged(self, handler, **options):
+		"""
+		Indicates that the metadata of a track in the tracklist has changed.
+		
+		This may indicate that a track has been replaced, in which case the
+		mpris:trackid metadata entry is different from the TrackId argument.
+
+		:Parameters:
+			`TrackId` — o (Track_Id)
+				The id of the track which metadata has changed.
+				If the track id has changed, this will be the old value.
+				/org/mpris/MediaPlayer2/TrackList/NoTrack is not a valid value
+				for this argument.
+			`Metadata` — a{sv} (Metadata_Map)
+				The new track metadata.
+				This must include a mpris:trackid entry. If the track id has
+				changed, this will be the new value.
+				See the type documentation for more details.
+		"""
+		return self.connect('TrackMetadataChanged', handler, **options)
+	
+
+class TrackListMirror:
+	"""
+	Local copy of the track ids of a tracklist. It is filled once from the
+	Tracks property, then kept up to date from the TrackAdded, TrackRemoved,
+	TrackListReplaced and TrackMetadataChanged signals, since the
+	PropertiesChanged signal of Tracks does not carry the new value.
+	
+	Tracks are kept in a doubly linked list indexed by track id, so that
+	inserting after a track and removing a track take constant time.
+	
+	A track added after a track the mirror does not know means that a
+	signal was missed : the mirror is then marked as stale, and filled
+	again from the Tracks property by `sync`.
+	
+	Signals are only received while a main loop is running.
+	"""
+	
+	def __init__(self, tracklist):
+		"""
+		:Parameters:
+			`tracklist` : TrackList
+				tracklist to mirror
+		"""
+		self.tracklist = tracklist
+		self.after     = {}
+		self.before    = {}
+		self.first     = None
+		self.last      = None
+		self.current   = None
+		self.stale     = False
+		
+		tracklist.on_TrackAdded(self.track_added)
+		tracklist.on_TrackRemoved(self.track_removed)
+		tracklist.on_TrackListReplaced(self.tracklist_replaced)
+		tracklist.on_TrackMetadataChanged(self.track_metadata_changed)
+		
+		self.replace(tracklist.Tracks())
+	
+	def __len__(self):
+		return len(self.after)
+	
+	def __contains__(self, track_id):
+		return track_id in self.after
+	
+	def __iter__(self):
+		track_id = self.first
+		
+		while track_id is not None:
+			yield track_id
+			track_id = self.after[track_id]
+	
+	def tracks(self):
+		"""
+		Get the track ids, in order.
+		"""
+		return list(self)
+	
+	def sync(self):
+		"""
+		Fill the mirror again from the Tracks property if it is stale.
+		"""
+		if self.stale:
+			self.replace(self.tracklist.Tracks(), self.current)
+	
+	def replace(self, tracks, current=None):
+		"""
+		Replace the whole content of the mirror.
+		"""
+		self.after.clear()
+		self.before.clear()
+		self.first   = None
+		self.last    = None
+		self.current = current is not None and str(current) or None
+		self.stale   = False
+		
+		for track_id in tracks:
+			self.insert(track_id, self.last)
+	
+	def insert(self, track_id, after_track):
+		"""
+		Insert a track after an other one. If `after_track` is None or
+		`MPRIS.NO_TRACK`, the track is inserted at the start. A track which
+		is already in the mirror is moved. If `after_track` is not in the
+		mirror, nothing is inserted and the mirror is marked as stale.
+		"""
+		if after_track is not None and after_track != MPRIS.NO_TRACK and \
+				after_track not in self.after:
+			self.stale = True
+			return
+		
+		track_id = str(track_id)
+		
+		if track_id in self.after:
+			self.remove(track_id)
+		
+		if after_track is None or after_track == MPRIS.NO_TRACK:
+			following = self.first
+			after_track = None
+			self.first = track_id
+		else:
+			after_track = str(after_track)
+			following = self.after[after_track]
+			self.after[after_track] = track_id
+		
+		self.before[track_id] = after_track
+		self.after[track_id]  = following
+		
+		if following is None:
+			self.last = track_id
+		else:
+			self.before[following] = track_id
+	
+	def remove(self, track_id):
+		"""
+		Remove a track, nothing is done if it is not in the mirror.
+		"""
+		if track_id not in self.after:
+			return
+		
+		previous  = self.before.pop(track_id)
+		following = self.after.pop(track_id)
+		
+		if previous is None:
+			self.first = following
+		else:
+			self.after[previous] = following
+		
+		if following is None:
+			self.last = previous
+		else:
+			self.before[following] = previous
+	
+	def rename(self, track_id, new_id):
+		"""
+		Change the id of a track, keeping its position.
+		"""
+		if track_id not in self.after or new_id in self.after:
+			return
+		
+		new_id = str(new_id)
+		
+		previous  = self.before.pop(track_id)
+		following = self.after.pop(track_id)
+		
+		self.before[new_id] = previous
+		self.after[new_id]  = following
+		
+		if previous is None:
+			self.first = new_id
+		else:
+			self.after[previous] = new_id
+		
+		if following is None:
+			self.last = new_id
+		else:
+			self.before[following] = new_id
+		
+		if self.current == track_id:
+			self.current = new_id
+	
+	def track_added(self, metadata, after_track):
+		"""
+		Handler of the TrackAdded signal.
+		"""
+		self.insert(metadata['mpris:trackid'], after_track)
+	
+	def track_removed(self, track_id):
+		"""
+		Handler of the TrackRemoved signal.
+		"""
+		self.remove(track_id)
+	
+	def tracklist_replaced(self, tracks, current=None):
+		"""
+		Handler of the TrackListReplaced signal.
+		"""
+		self.replace(tracks, current)
+	
+	def track_metadata_changed(self, track_id, metadata):
+		"""
+		Handler of the TrackMetadataChanged signal, the id of the track may
+		have changed.
+		"""
+		new_id = metadata.get('mpris:trackid')
+		
+		if new_id is not None and new_id != track_id:
+			self.rename(track_id, new_id)
+
+class MetadataCache:
+	"""
+	Metadata of tracks indexed by track id. When the estimated memory used
+	by the entries goes over `max_size`, the least recently used ones are
+	evicted.
+	"""
+	
+	def __init__(self, max_size=16 * 1024 * 1024):
+		"""
+		:Parameters:
+			`max_size` : int
+				maximum estimated size of the entries, in bytes
+		"""
+		self.max_size = max_size
+		self.size     = 0
+		self.entries  = collections.OrderedDict()
+	
+	def __len__(self):
+		return len(self.entries)
+	
+	def __contains__(self, track_id):
+		return track_id in self.entries
+	
+	def get(self, track_id, default=None):
+		"""
+		Get the metadata of a track, marking it as recently used.
+		"""
+		entry = self.entries.pop(track_id, None)
+		
+		if entry is None:
+			return default
+		
+		self.entries[track_id] = entry
+		
+		return entry[0]
+	
+	def put(self, track_id, metadata):
+		"""
+		Add or replace the metadata of a track, evicting the least recently
+		used entries if needed.
+		"""
+		self.discard(track_id)
+		
+		size = estimate_size(metadata)
+		
+		self.entries[track_id] = (metadata, size)
+		self.size += size
+		
+		while self.size > self.max_size and len(self.entries) > 1:
+			self.size -= self.entries.popitem(last=False)[1][1]
+	
+	def discard(self, track_id):
+		"""
+		Drop the metadata of a track, if cached.
+		"""
+		entry = self.entries.pop(track_id, None)
+		
+		if entry is not None:
+			self.size -= entry[1]
+	
+	def clear(self):
+		self.entries.clear()
+		self.size = 0
+	
+	def track_changed(self, track_id, metadata):
+		"""
+		Handler of the TrackMetadataChanged signal.
+		"""
+		self.discard(track_id)
+	
+	def tracklist_replaced(self, tracks, current=None):
+		"""
+		Handler of the TrackListReplaced signal.
+		"""
+		self.clear()
+
+def estimate_size(value):
+	"""
+	Estimate the memory used by a value and the values it contains, in
+	bytes.
+	"""
+	size = sys.getsizeof(value)
+	
+	if isinstance(value, dict):
+		for key in value:
+			size += sys.getsizeof(key) + estimate_size(value[key])
+	elif isinstance(value, (list, tuple)):
+		for item in value:
+			size += estimate_size(item)
+	elif isinstance(value, Track):
+		for name in Track.__slots__:
+			size += estimate_size(getattr(value, name))
+	
+	return size
+
+class TrackIndex:
+	"""
+	Inverted index of the words of the xesam fields listed in
+	`SEARCH_FIELDS`, to find tracks of the tracklist without fetching all
+	their metadata for each search.
+	
+	The index is built from the `TrackListMirror` with
+	`TrackList.iter_metadata`, then kept up to date from the TrackAdded,
+	TrackRemoved and TrackMetadataChanged signals. It is built again on the
+	next search when the tracklist is replaced.
+	
+	Signals are only received while a main loop is running.
+	"""
+	
+	def __init__(self, tracklist):
+		"""
+		:Parameters:
+			`tracklist` : TrackList
+				tracklist to index
+		"""
+		self.tracklist = tracklist
+		self.postings  = {}
+		self.words     = {}
+		self.built     = False
+		
+		tracklist.on_TrackAdded(self.track_added)
+		tracklist.on_TrackRemoved(self.track_removed)
+		tracklist.on_TrackListReplaced(self.tracklist_replaced)
+		tracklist.on_TrackMetadataChanged(self.track_metadata_changed)
+	
+	def __len__(self):
+		return len(self.words)
+	
+	def build(self):
+		"""
+		Index all the tracks of the tracklist.
+		"""
+		self.clear()
+		
+		for track in self.tracklist.iter_metadata(self.tracklist.mirror().tracks()):
+			self.add(track)
+		
+		self.built = True
+	
+	def clear(self):
+		self.postings.clear()
+		self.words.clear()
+		self.built = False
+	
+	def add(self, track):
+		"""
+		Index a `Track`, replacing the previous entry of the same id.
+		"""
+		track_id = track.trackid
+		
+		if track_id is None:
+			return
+		
+		self.remove(track_id)
+		
+		words = {}
+		
+		for field, weight in SEARCH_FIELDS:
+			for word in search_words(getattr(track, field)):
+				if words.get(word, 0) < weight:
+					words[word] = weight
+		
+		for word, weight in words.iteritems():
+			self.postings.setdefault(word, {})[track_id] = weight
+		
+		self.words[track_id] = tuple(words)
+	
+	def remove(self, track_id):
 		"""
-		If false, calling AddTrack or RemoveTrack will have no effect, and
-		may raise a NotSupported error.
-
-		When this property changes, the
-		org.freedesktop.DBus.Properties.PropertiesChanged signal is emitted
-		with the new value.
-
-		Read only
+		Remove a track from the index, if indexed.
 		"""
-		return self.get("CanEditTracks")
+		for word in self.words.pop(track_id, ()):
+			posting = self.postings[word]
+			del posting[track_id]
+			
+			if not posting:
+				del self.postings[word]
 	
-	def on_TrackListReplaced(self, handler):
+	def search(self, query, limit=None):
 		"""
-		Indicates that the entire tracklist has been replaced.
+		Find the tracks matching all the words of `query`, ignoring case.
+		
+		Each word scores the weight of the best field it is found in, see
+		`SEARCH_FIELDS`. Tracks with the same score are kept in the order of
+		the tracklist.
 		
-		It is left up to the implementation to decide when a change to the track
-		list is invasive enough that this signal should be emitted instead of a
-		series of TrackAdded and TrackRemoved signals.
-
 		:Parameters:
-			`Tracks` — ao (Track_Id_List)
-				The new content of the tracklist.
-			`CurrentTrack` — o (Track_Id)
-				The identifier of the track to be considered as current.
-				/org/mpris/MediaPlayer2/TrackList/NoTrack indicates that there
-				is no current track. This should correspond to the
-				mpris:trackid field of the Metadata property of the
-				org.mpris.MediaPlayer2.Player interface.
+			`query` : string
+				words to search
+			`limit` : int
+				maximum number of tracks returned, all of them if None
+		
+		:return: list of track ids, best match first
 		"""
-		self.connect('TrackListReplaced', handler)
+		if not self.built:
+			self.build()
+		
+		scores = None
+		
+		for word in set(search_words(query)):
+			posting = self.postings.get(word)
+			
+			if posting is None:
+				return []
+			
+			if scores is None:
+				scores = dict(posting)
+			else:
+				scores = dict((track_id, score + posting[track_id]) \
+					for track_id, score in scores.iteritems() if track_id in posting)
+		
+		if not scores:
+			return []
+		
+		order = {}
+		
+		for position, track_id in enumerate(self.tracklist.mirror()):
+			if track_id in scores:
+				order[track_id] = position
+		
+		found = sorted(scores, key=lambda track_id: \
+			(-scores[track_id], order.get(track_id, len(order))))
+		
+		return found[:limit]
 	
-	def on_TrackAdded(self, handler):
+	def track_added(self, metadata, after_track):
 		"""
-		Indicates that a track has been added to the track list.
-	
-		:Parameters:
-			`Metadata` — a{sv} (Metadata_Map)
-				The metadata of the newly added item.
-				This must include a mpris:trackid entry.
-				See the type documentation for more details.
-			`AfterTrack` — o (Track_Id)
-				The identifier of the track after which the new track was
-				inserted. The path /org/mpris/MediaPlayer2/TrackList/NoTrack
-				indicates that the track was inserted at the start of the track
-				list.
+		Handler of the TrackAdded signal.
 		"""
-		self.connect('TrackAdded', handler)
+		if self.built:
+			self.add(Track(metadata))
 	
-	def on_TrackRemoved(self, handler):
+	def track_removed(self, track_id):
 		"""
-		Indicates that a track has been removed from the track list.
-
-		:Parameters:
-			`TrackId` — o (Track_Id)
-				The identifier of the track being removed.
-				/org/mpris/MediaPlayer2/TrackList/NoTrack is not a valid value
-				for this argument.
+		Handler of the TrackRemoved signal.
 		"""
-		self.connect('TrackRemoved', handler)
+		self.remove(str(track_id))
 	
-	def on_TrackMetadataChanged(self, handler):
+	def tracklist_replaced(self, tracks, current=None):
 		"""
-		Indicates that the metadata of a track in the tracklist has changed.
-		
-		This may indicate that a track has been replaced, in which case the
-		mpris:trackid metadata entry is different from the TrackId argument.
-
-		:Parameters:
-			`TrackId` — o (Track_Id)
-				The id of the track which metadata has changed.
-				If the track id has changed, this will be the old value.
-				/org/mpris/MediaPlayer2/TrackList/NoTrack is not a valid value
-				for this argument.
-			`Metadata` — a{sv} (Metadata_Map)
-				The new track metadata.
-				This must include a mpris:trackid entry. If the track id has
-				changed, this will be the new value.
-				See the type documentation for more details.
+		Handler of the TrackListReplaced signal.
 		"""
-		self.connect('TrackMetadataChanged', handler)
+		self.clear()
 	
+	def track_metadata_changed(self, track_id, metadata):
+		"""
+		Handler of the TrackMetadataChanged signal, the id of the track may
+		have changed.
+		"""
+		if self.built:
+			self.remove(str(track_id))
+			self.add(Track(metadata))
 
 class Playlists(Remote):
 	"""
@@ -1060,6 +3028,37 @@ class Playlists(Remote):
 	
 	def __init__(self, mpris):
 		Remote.__init__(self, mpris, MPRIS.INTERFACE_PLAYLISTS)
+		
+		self.playlist_browser = None
+		self.playlist_index   = None
+	
+	def index(self):
+		"""
+		Get the `PlaylistIndex` of this interface, it is created on the first
+		call and filled by the pages read from the browser.
+		"""
+		if self.playlist_index is None:
+			self.playlist_index = PlaylistIndex(self.browser())
+		
+		return self.playlist_index
+	
+	def browser(self, page_size=None):
+		"""
+		Get the `PlaylistBrowser` of this interface, it is created on the
+		first call.
+		
+		:Parameters:
+			`page_size` : int
+				see `PlaylistBrowser`
+		"""
+		if self.playlist_browser is None:
+			self.playlist_browser = PlaylistBrowser(self)
+		
+		if page_size is not None and page_size != self.playlist_browser.page_size:
+			self.playlist_browser.page_size = page_size
+			self.playlist_browser.invalidate()
+		
+		return self.playlist_browser
 	
 	def ActivatePlaylist(self, playlist_id):
 		"""
@@ -1079,7 +3078,7 @@ class Playlists(Remote):
 		Parameters :
 		- PlaylistId — o : The id of the playlist to activate.
 		"""
-		self.object.ActivatePlaylist(playlist_id)
+		self.object.ActivatePlaylist(playlist_id, signature='o')
 	
 	def GetPlaylists(self, index, max_count, order, reverse_order):
 		"""
@@ -1096,7 +3095,8 @@ class Playlists(Remote):
 		- Playlists — a(oss) (Playlist_List) : A list of (at most MaxCount)
 		  playlists.
 		"""
-		self.object.GetPlaylists(index, max_count, order, reverse_order)
+		return self.object.GetPlaylists(index, max_count, order, reverse_order,
+			signature='uusb')
 	
 	def PlaylistCount(self):
 		"""
@@ -1142,7 +3142,7 @@ class Playlists(Remote):
 		"""
 		return self.get("ActivePlaylist")
 	
-	def on_PlaylistChanged(self, handler):
+	def on_PlaylistChanged(self, handler, **options):
 		"""
 		Indicates that either the Name or Icon attribute of a playlist has
 		changed. Client implementations should be aware that this signal may
@@ -1152,7 +3152,635 @@ class Playlists(Remote):
 			`Playlist` — (oss) (Playlist)
 				The playlist which details have changed.
 		"""
-		self.connect('PlayListChanged', handler)
+		return self.connect('PlaylistChanged', handler, **options)
+
+class PlaylistBrowser:
+	"""
+	Pages through the playlists of a player.
+	
+	Playlists are fetched with GetPlaylists by pages of `page_size`, on
+	demand. When a page is read, the next one is requested right away
+	without waiting for the reply, so that it is usually there when
+	needed. Pages are cached per ordering. They are dropped when
+	PlaylistCount or Orderings change ; on PlaylistChanged, the playlist
+	is updated in the cached pages and the pages of the alphabetical
+	ordering, which depends on the name, are dropped.
+	
+	Playlists are (id, name, icon) tuples.
+	
+	Signals are only received while a main loop is running.
+	"""
+	
+	def __init__(self, playlists, page_size=100):
+		"""
+		:Parameters:
+			`playlists` : Playlists
+				interface to browse
+			`page_size` : int
+				number of playlists fetched at once
+		"""
+		self.playlists = playlists
+		self.page_size = page_size
+		self.batch     = Batch(playlists.mpris.bus)
+		self.pages     = {}
+		self.count     = None
+		self.orderings = None
+		self.index     = None
+		
+		playlists.on_PlaylistChanged(self.playlist_changed)
+		playlists.on_PropertiesChanged(self.properties_changed)
+	
+	def __len__(self):
+		if self.count is None:
+			self.count = self.playlists.PlaylistCount()
+		
+		return self.count
+	
+	def default_order(self):
+		"""
+		The first ordering offered by the player.
+		"""
+		if self.orderings is None:
+			self.orderings = self.playlists.Orderings()
+		
+		return self.orderings[0]
+	
+	def request(self, number, order, reverse):
+		"""
+		Send the request of a page, without waiting for the reply.
+		"""
+		return self.playlists.submit(self.batch, "GetPlaylists", "uusb",
+			(number * self.page_size, self.page_size, order, reverse))
+	
+	def page(self, number, order=None, reverse=False):
+		"""
+		Get a page of playlists, and prefetch the next one.
+		
+		:Parameters:
+			`number` : int
+				number of the page, the first one is 0
+			`order` : string
+				one of the orderings of the player, defaults to the first one
+			`reverse` : bool
+				reverse the ordering
+		"""
+		if order is None:
+			order = self.default_order()
+		
+		pages = self.pages.setdefault((order, reverse), {})
+		entry = pages.get(number)
+		
+		if entry is None:
+			entry = self.request(number, order, reverse)
+		
+		if isinstance(entry, Reply):
+			#
+			# A failed page is requested again on next read.
+			#
+			try:
+				entry = convert_value(entry.wait(), 'a(oss)')
+			except dbus.DBusException:
+				pages.pop(number, None)
+				raise
+			
+			pages[number] = entry
+			
+			if self.index is not None:
+				self.index.add(entry)
+		
+		following = number + 1
+		
+		if following * self.page_size < len(self) and following not in pages:
+			pages[following] = self.request(following, order, reverse)
+		
+		return entry
+	
+	def window(self, index, count, order=None, reverse=False):
+		"""
+		Get `count` playlists starting at `index`.
+		"""
+		playlists = []
+		end       = min(index + count, len(self))
+		
+		while index < end:
+			number, offset = divmod(index, self.page_size)
+			page = self.page(number, order, reverse)
+			
+			if offset >= len(page):
+				break
+			
+			playlists.extend(page[offset:offset + end - index])
+			index = (number + 1) * self.page_size
+		
+		return playlists
+	
+	def __iter__(self):
+		"""
+		Iterate over all the playlists, in the default ordering.
+		"""
+		number = 0
+		
+		while number * self.page_size < len(self):
+			for playlist in self.page(number):
+				yield playlist
+			
+			number += 1
+	
+	def invalidate(self):
+		"""
+		Drop all the cached pages, and the index.
+		"""
+		self.pages.clear()
+		self.count     = None
+		self.orderings = None
+		
+		if self.index is not None:
+			self.index.clear()
+	
+	def playlist_changed(self, playlist):
+		"""
+		Handler of the PlaylistChanged signal.
+		"""
+		playlist = convert_value(playlist, '(oss)')
+		
+		for key in self.pages.keys():
+			if key[0] == "Alphabetical":
+				del self.pages[key]
+				continue
+			
+			pages = self.pages[key]
+			
+			for number in pages.keys():
+				if isinstance(pages[number], Reply):
+					del pages[number]
+					continue
+				
+				page = pages[number]
+				
+				for i in xrange(len(page)):
+					if page[i][0] == playlist[0]:
+						page[i] = playlist
+	
+	def properties_changed(self, interface, changed, invalidated):
+		"""
+		Handler of the PropertiesChanged signal of the playlists interface.
+		"""
+		for prop in ('PlaylistCount', 'Orderings'):
+			if prop in changed or prop in invalidated:
+				self.invalidate()
+				break
+
+def fold(name):
+	"""
+	Case-folded form of a utf-8 string, used by the indexes.
+	"""
+	return name.decode('utf-8', 'replace').lower()
+
+def search_words(value):
+	"""
+	Case-folded words of a string, or of a list of strings, used by
+	`TrackIndex`.
+	"""
+	if value is None:
+		return []
+	
+	if isinstance(value, (list, tuple)):
+		value = " ".join(value)
+	
+	return re.findall(r'\w+', fold(value), re.UNICODE)
+
+class PlaylistIndex:
+	"""
+	In-memory index of playlists by name, supporting exact, case-folded and
+	prefix lookups.
+	
+	The index is filled with the pages fetched by a `PlaylistBrowser`, and
+	completed by browsing all the playlists when a lookup finds nothing.
+	It is kept up to date from PlaylistChanged, and cleared with the pages
+	of the browser when the playlists change.
+	
+	Signals are only received while a main loop is running.
+	"""
+	
+	def __init__(self, browser):
+		"""
+		:Parameters:
+			`browser` : PlaylistBrowser
+				browser whose pages fill the index
+		"""
+		self.browser   = browser
+		self.playlists = {}
+		self.names     = {}
+		self.folded    = {}
+		self.sorted    = []
+		self.complete  = False
+		
+		browser.index = self
+		browser.playlists.on_PlaylistChanged(self.playlist_changed)
+		
+		for pages in browser.pages.values():
+			for page in pages.values():
+				if not isinstance(page, Reply):
+					self.add(page)
+	
+	def __len__(self):
+		return len(self.playlists)
+	
+	def add(self, playlists):
+		"""
+		Add or update playlists, given as (id, name, icon) tuples.
+		"""
+		for playlist in playlists:
+			self.remove(playlist[0])
+			
+			playlist_id, name = playlist[0], playlist[1]
+			folded = fold(name)
+			
+			self.playlists[playlist_id] = playlist
+			self.names.setdefault(name, set()).add(playlist_id)
+			self.folded.setdefault(folded, set()).add(playlist_id)
+			bisect.insort(self.sorted, (folded, playlist_id))
+	
+	def remove(self, playlist_id):
+		"""
+		Remove a playlist, if indexed.
+		"""
+		playlist = self.playlists.pop(playlist_id, None)
+		
+		if playlist is None:
+			return
+		
+		name   = playlist[1]
+		folded = fold(name)
+		
+		for index, key in ((self.names, name), (self.folded, folded)):
+			ids = index[key]
+			ids.discard(playlist_id)
+			
+			if not ids:
+				del index[key]
+		
+		i = bisect.bisect_left(self.sorted, (folded, playlist_id))
+		
+		if i < len(self.sorted) and self.sorted[i] == (folded, playlist_id):
+			del self.sorted[i]
+	
+	def clear(self):
+		self.playlists.clear()
+		self.names.clear()
+		self.folded.clear()
+		self.sorted   = []
+		self.complete = False
+	
+	def build(self):
+		"""
+		Browse all the playlists to complete the index.
+		"""
+		for playlist in self.browser:
+			pass
+		
+		self.complete = True
+	
+	def exact(self, name):
+		"""
+		Get the playlists with exactly this name.
+		"""
+		return [self.playlists[i] for i in self.names.get(name, ())]
+	
+	def casefold(self, name):
+		"""
+		Get the playlists with this name, ignoring case.
+		"""
+		return [self.playlists[i] for i in self.folded.get(fold(name), ())]
+	
+	def prefix(self, prefix):
+		"""
+		Get the playlists whose name starts with `prefix`, ignoring case,
+		sorted by name.
+		"""
+		prefix = fold(prefix)
+		found  = []
+		
+		for i in xrange(bisect.bisect_left(self.sorted, (prefix,)), len(self.sorted)):
+			folded, playlist_id = self.sorted[i]
+			
+			if not folded.startswith(prefix):
+				break
+			
+			found.append(self.playlists[playlist_id])
+		
+		return found
+	
+	def find(self, name):
+		"""
+		Find the playlist best matching `name` : exact match first, then
+		ignoring case, then by prefix. The index is completed if nothing is
+		found.
+		
+		:return: a (id, name, icon) tuple, or None, always for an empty name
+		"""
+		if not name:
+			return None
+		
+		while True:
+			for lookup in (self.exact, self.casefold, self.prefix):
+				found = lookup(name)
+				
+				if found:
+					return found[0]
+			
+			if self.complete:
+				return None
+			
+			self.build()
+	
+	def playlist_changed(self, playlist):
+		"""
+		Handler of the PlaylistChanged signal.
+		"""
+		playlist = convert_value(playlist, '(oss)')
+		
+		if playlist[0] in self.playlists:
+			self.add([playlist])
+
+#
+# Metadata keys documented by `Metadata`, and the name of the matching field
+# of `Track`.
+#
+TRACK_FIELDS = (
+	('mpris:trackid',        'trackid'),
+	('mpris:length',         'length'),
+	('mpris:artUrl',         'artUrl'),
+	('xesam:album',          'album'),
+	('xesam:albumArtist',    'albumArtist'),
+	('xesam:artist',         'artist'),
+	('xesam:asText',         'asText'),
+	('xesam:audioBPM',       'audioBPM'),
+	('xesam:autoRating',     'autoRating'),
+	('xesam:comment',        'comment'),
+	('xesam:composer',       'composer'),
+	('xesam:contentCreated', 'contentCreated'),
+	('xesam:discNumber',     'discNumber'),
+	('xesam:firstUsed',      'firstUsed'),
+	('xesam:genre',          'genre'),
+	('xesam:lastUsed',       'lastUsed'),
+	('xesam:lyricist',       'lyricist'),
+	('xesam:title',          'title'),
+	('xesam:trackNumber',    'trackNumber'),
+	('xesam:url',            'url'),
+	('xesam:useCount',       'useCount'),
+	('xesam:userRating',     'userRating'),
+)
+
+#
+# Fields of `Track` indexed by `TrackIndex`, with the weight of a match in
+# each of them.
+#
+SEARCH_FIELDS = (
+	('title',       8),
+	('artist',      4),
+	('albumArtist', 3),
+	('album',       2),
+	('composer',    2),
+	('genre',       1),
+)
+
+#
+# Fields whose values are shared by many tracks.
+#
+TRACK_INTERNED = frozenset(('album', 'albumArtist', 'artist', 'composer',
+	'genre', 'lyricist'))
+
+def convert_string(value):
+	return value.encode('utf-8')
+
+#
+# Converters of the basic D-Bus types, indexed by type code.
+#
+BASIC_CONVERTERS = {
+	's': convert_string,
+	'o': str,
+	'g': str,
+	'b': bool,
+	'd': float,
+	'y': int,
+	'n': int,
+	'q': int,
+	'i': int,
+	'u': int,
+	'x': int,
+	't': int,
+	'h': int,
+}
+
+#
+# Converters of the basic D-Bus types, indexed by the dbus type wrapping
+# a value in a variant.
+#
+VARIANT_CONVERTERS = {
+	dbus.String:     convert_string,
+	dbus.ObjectPath: str,
+	dbus.Signature:  str,
+	dbus.Boolean:    bool,
+	dbus.Double:     float,
+	dbus.Byte:       int,
+	dbus.Int16:      int,
+	dbus.UInt16:     int,
+	dbus.Int32:      int,
+	dbus.UInt32:     int,
+	dbus.Int64:      int,
+	dbus.UInt64:     int,
+}
+
+#
+# Converters built by `converter`, indexed by signature.
+#
+CONVERTERS = {}
+
+def converter(signature):
+	"""
+	Get the function converting a value of the single complete D-Bus type
+	`signature` to python types. Functions are built once per signature,
+	by composing the converters of the contained types.
+	"""
+	function = CONVERTERS.get(signature)
+	
+	if function is None:
+		function, rest = parse_signature(signature)
+		
+		if rest:
+			raise ValueError("not a single complete type: " + signature)
+		
+		CONVERTERS[signature] = function
+	
+	return function
+
+def parse_signature(signature):
+	"""
+	Build the converter of the first complete type of `signature`.
+	
+	:return: a tuple (converter, rest of the signature)
+	"""
+	code = signature[:1]
+	
+	if code in BASIC_CONVERTERS:
+		return BASIC_CONVERTERS[code], signature[1:]
+	elif code == 'v':
+		return convert_value, signature[1:]
+	elif code == 'a' and signature[1:2] == '{':
+		key, rest   = parse_signature(signature[2:])
+		value, rest = parse_signature(rest)
+		
+		if rest[:1] != '}':
+			raise ValueError("invalid signature: " + signature)
+		
+		def convert_dict(d):
+			return dict((key(k), value(v)) for k, v in d.iteritems())
+		
+		return convert_dict, rest[1:]
+	elif code == 'a':
+		item, rest = parse_signature(signature[1:])
+		
+		def convert_array(a):
+			return [item(v) for v in a]
+		
+		return convert_array, rest
+	elif code == '(':
+		fields = []
+		rest   = signature[1:]
+		
+		while rest[:1] != ')':
+			if not rest:
+				raise ValueError("invalid signature: " + signature)
+			
+			field, rest = parse_signature(rest)
+			fields.append(field)
+		
+		def convert_struct(s):
+			return tuple(field(v) for field, v in zip(fields, s))
+		
+		return convert_struct, rest[1:]
+	
+	raise ValueError("invalid signature: " + signature)
+
+def convert_value(value, signature=None):
+	"""
+	Convert a dbus value, and all the values it contains, to python types
+	in a single traversal : strings are encoded in utf-8, object paths and
+	signatures become str, arrays lists, dicts dicts and structs tuples.
+	
+	:Parameters:
+		`value`
+			dbus value
+		`signature` : string
+			D-Bus type of the value ; if not given, the type is found from the
+			dbus type of the value, as for the content of a variant
+	"""
+	if signature is not None:
+		return converter(signature)(value)
+	
+	function = VARIANT_CONVERTERS.get(type(value))
+	
+	if function is not None:
+		return function(value)
+	elif isinstance(value, dbus.Dictionary) and value.signature:
+		return converter("a{%s}" % value.signature)(value)
+	elif isinstance(value, dbus.Array) and value.signature:
+		return converter("a" + value.signature)(value)
+	elif isinstance(value, dbus.Struct) and value.signature:
+		return converter("(%s)" % value.signature)(value)
+	elif isinstance(value, dict):
+		return dict((convert_value(k), convert_value(v)) \
+			for k, v in value.iteritems())
+	elif isinstance(value, list):
+		return [convert_value(v) for v in value]
+	elif isinstance(value, tuple):
+		return tuple(convert_value(v) for v in value)
+	
+	return value
+
+def interned(value):
+	"""
+	Intern a string, or the strings of a list, returned as a tuple.
+	"""
+	if isinstance(value, str):
+		return intern(value)
+	elif isinstance(value, (list, tuple)):
+		return tuple(interned(item) for item in value)
+	
+	return value
+
+class Track(object):
+	"""
+	Compact and immutable record of the metadata of a track.
+	
+	Values are converted from dbus types once. Fields are the keys
+	documented by `Metadata`, named as its accessors, None when missing.
+	Strings repeated across tracks, such as artists, albums and genres, are
+	interned. Other keys are kept in the `extra` dict.
+	"""
+	
+	__slots__ = tuple(field for key, field in TRACK_FIELDS) + ('extra',)
+	
+	KEYS = dict(TRACK_FIELDS)
+	
+	def __init__(self, metadata):
+		"""
+		:Parameters:
+			`metadata` : dict
+				metadata map, as given by the player
+		"""
+		init  = object.__setattr__
+		extra = None
+		
+		for field in Track.__slots__:
+			init(self, field, None)
+		
+		for key in metadata:
+			field = Track.KEYS.get(key)
+			value = convert_value(metadata[key])
+			
+			if field is None:
+				if extra is None:
+					extra = {}
+				
+				extra[key.encode('utf-8')] = value
+			else:
+				if field in TRACK_INTERNED:
+					value = interned(value)
+				elif type(value) is list:
+					value = tuple(value)
+				
+				init(self, field, value)
+		
+		init(self, 'extra', extra)
+	
+	def __setattr__(self, name, value):
+		raise AttributeError("Track is immutable")
+	
+	def __delattr__(self, name):
+		raise AttributeError("Track is immutable")
+	
+	def __repr__(self):
+		return "<Track %s %r>" % (self.trackid, self.title)
+	
+	def get(self, key, default=None):
+		"""
+		Get a value by its metadata key, such as "xesam:title".
+		"""
+		field = Track.KEYS.get(key)
+		
+		if field is not None:
+			value = getattr(self, field)
+		elif self.extra is not None:
+			value = self.extra.get(key)
+		else:
+			value = None
+		
+		if value is None:
+			return default
+		
+		return value
 
 class Metadata:
 	"""
@@ -1191,12 +3819,12 @@ class Metadata:
 		self.mpris = mpris
 		self.data  = mpris.player.Metadata()
 		
-		mpris.properties.connect_to_signal('PropertiesChanged', self.update)
+		mpris.player.on_PropertiesChanged(self.update, ('Metadata',))
 	
 	def update(self, *args):
 		if len(args) > 1 and args[0] == MPRIS.INTERFACE_PLAYER and 'Metadata' in args [1]:
-			self.data = args[1]['Metadata']
-			print "Current track:", self.title()
+			self.data = convert_value(args[1]['Metadata'], 'a{sv}')
+			self.mpris.notify_track()
 	
 	def trackid(self):
 		"""
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+"""
+Thumbnails of album art, for the notifications of track changes.
+
+Images given by the mpris:artUrl of the tracks are read from file:// URIs,
+or fetched with urllib2 for other schemes, then downscaled once with PIL,
+or with gtk.gdk if PIL is missing. Thumbnails are kept in a size-bounded
+directory, and their paths in memory, both keyed by the URL and the
+modification time of the image, so that the same art is never decoded
+twice.
+"""
+
+__all__ = ('ArtCache', 'thumbnail', 'art_path')
+__docformat__ = 'reStructuredText'
+
+import os, sys, time, hashlib, threading, collections
+import urllib, urllib2, urlparse
+
+def art_path():
+	"""
+	Default directory of the thumbnails.
+	"""
+	cache = os.environ.get('XDG_CACHE_HOME') or \
+		os.path.join(os.path.expanduser("~"), ".cache")
+	
+	return os.path.join(cache, "mpris-controller", "art")
+
+def scale_pil(source, target, size):
+	from PIL import Image
+	
+	image = Image.open(source)
+	image.thumbnail((size, size), Image.ANTIALIAS)
+	
+	if image.mode not in ("RGB", "RGBA"):
+		image = image.convert("RGBA")
+	
+	image.save(target, "PNG")
+
+def scale_gdk(source, target, size):
+	import gtk.gdk
+	
+	pixbuf = gtk.gdk.pixbuf_new_from_file_at_size(source, size, size)
+	pixbuf.save(target, "png")
+
+#
+# Functions downscaling an image file into a PNG file, tried in order.
+#
+SCALERS = (scale_pil, scale_gdk)
+
+class ArtCache:
+	"""
+	Thumbnails of album art, on disk and in memory. It may be used from
+	several threads.
+	"""
+	
+	def __init__(self, path=None, size=96, max_size=8 * 1024 * 1024,
+			max_entries=256):
+		"""
+		:Parameters:
+			`path` : string
+				directory of the thumbnails, see `art_path`
+			`size` : int
+				maximum width and height of the thumbnails, in pixels
+			`max_size` : int
+				maximum size of the directory, in bytes ; the least recently
+				used thumbnails are removed past it
+			`max_entries` : int
+				maximum number of paths kept in memory
+		"""
+		self.path        = path or art_path()
+		self.size        = size
+		self.max_size    = max_size
+		self.max_entries = max_entries
+		self.entries     = collections.OrderedDict()
+		self.disk_size   = None
+		self.lock        = threading.Lock()
+	
+	def thumbnail(self, url):
+		"""
+		Get the path of the thumbnail of an image.
+		
+		:return: a path, the path of the image itself if it is local and can
+			not be downscaled, or None if it can not be read
+		"""
+		with self.lock:
+			try:
+				return self.lookup(url)
+			except (IOError, OSError, urllib2.URLError) as e:
+				print >>sys.stderr, "album art unavailable:", url, e
+				return None
+	
+	def lookup(self, url):
+		parsed = urlparse.urlparse(url)
+		local  = None
+		mtime  = 0
+		
+		#
+		# Remote images have no modification time at hand, they are cached
+		# by URL only.
+		#
+		if parsed.scheme in ("", "file"):
+			local = urllib.url2pathname(parsed.path)
+			mtime = os.stat(local).st_mtime
+		
+		key  = (url, mtime)
+		path = self.entries.pop(key, None)
+		
+		if path is None:
+			name = hashlib.sha1("%s\0%r" % (url, mtime)).hexdigest()
+			path = os.path.join(self.path, name + ".png")
+			
+			if os.path.exists(path):
+				os.utime(path, None)
+			else:
+				path = self.create(url, local, path)
+		
+		self.entries[key] = path
+		
+		while len(self.entries) > self.max_entries:
+			self.entries.popitem(last=False)
+		
+		return path
+	
+	def create(self, url, local, path):
+		"""
+		Create the thumbnail of an image.
+		
+		:return: the path of the thumbnail, or of the image if it can not be
+			downscaled
+		"""
+		if not os.path.isdir(self.path):
+			os.makedirs(self.path)
+		
+		source = local
+		
+		if source is None:
+			source = path + ".download"
+			reply  = urllib2.urlopen(url, timeout=5)
+			
+			try:
+				with open(source, "wb") as f:
+					f.write(reply.read())
+			finally:
+				reply.close()
+		
+		try:
+			for scale in SCALERS:
+				try:
+					scale(source, path, self.size)
+					break
+				except Exception:
+					continue
+			else:
+				#
+				# No way to downscale, remote images are kept as they are.
+				#
+				if local is not None:
+					return local
+				
+				os.rename(source, path)
+				source = None
+		finally:
+			if source is not None and source != local:
+				os.unlink(source)
+		
+		self.added(os.path.getsize(path))
+		
+		return path
+	
+	def added(self, size):
+		"""
+		Account for a new thumbnail, removing the least recently used ones
+		if the directory grows over `max_size`.
+		"""
+		if self.disk_size is None:
+			files = self.files()
+			self.disk_size = sum(size for mtime, size, path in files)
+		else:
+			self.disk_size += size
+			files = None
+		
+		if self.disk_size <= self.max_size:
+			return
+		
+		for mtime, size, path in sorted(files or self.files())[:-1]:
+			if self.disk_size <= self.max_size:
+				break
+			
+			os.unlink(path)
+			self.disk_size -= size
+		
+		removed = set(path for path in self.entries.values() \
+			if path.startswith(self.path) and not os.path.exists(path))
+		
+		for key in [key for key in self.entries if self.entries[key] in removed]:
+			del self.entries[key]
+	
+	def files(self):
+		"""
+		List the thumbnails as (mtime, size, path) tuples.
+		"""
+		files = []
+		
+		for name in os.listdir(self.path):
+			path = os.path.join(self.path, name)
+			info = os.stat(path)
+			files.append((info.st_mtime, info.st_size, path))
+		
+		return files
+
+#
+# Cache shared by all the players of the process.
+#
+DEFAULT = ArtCache()
+
+def thumbnail(url):
+	"""
+	Get the path of the thumbnail of an image, from the default cache.
+	"""
+	return DEFAULT.thumbnail(url)
@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+
+"""
+Non-blocking counterpart of the `mpris` module.
+
+Method calls and property reads return a `Future` instead of waiting for
+the reply, so that many calls are in flight at once on a single
+connection, for as many players as needed, from one GLib main loop.
+Signals are delivered as iterators with `SignalStream`.
+
+Example::
+
+	a = AsyncMPRIS("vlc")
+	b = AsyncMPRIS("audacious")
+	
+	status = gather(a.player.PlaybackStatus(), b.player.PlaybackStatus())
+	
+	for position, in a.player.on_Seeked():
+		print position
+"""
+
+__all__ = ('Future', 'gather', 'SignalStream', 'AsyncMPRIS', 'AsyncRemote',
+	'AsyncRoot', 'AsyncPlayer', 'AsyncTrackList', 'AsyncPlaylists')
+__docformat__ = 'reStructuredText'
+
+import collections
+
+import dbus
+
+from mpris import MPRIS, mainloop, session_bus, convert_value
+
+gobject = mainloop()
+
+def iterate():
+	"""
+	Run one iteration of the default main context, blocking until an event
+	is dispatched.
+	"""
+	gobject.main_context_default().iteration(True)
+
+class Future:
+	"""
+	Result of a call which is not available yet.
+	"""
+	def __init__(self, convert=None):
+		"""
+		:Parameters:
+			`convert` : callable
+				applied to the result before it is stored
+		"""
+		self.convert   = convert
+		self.done      = False
+		self.value     = None
+		self.error     = None
+		self.callbacks = []
+	
+	def set_result(self, *args):
+		"""
+		Complete the future with the arguments of a reply.
+		"""
+		if len(args) == 0:
+			value = None
+		elif len(args) == 1:
+			value = args[0]
+		else:
+			value = args
+		
+		if self.convert is not None:
+			value = self.convert(value)
+		
+		self.value = value
+		self.complete()
+	
+	def set_exception(self, error):
+		"""
+		Complete the future with an error.
+		"""
+		self.error = error
+		self.complete()
+	
+	def complete(self):
+		self.done = True
+		
+		for callback in self.callbacks:
+			callback(self)
+		
+		self.callbacks = []
+	
+	def add_done_callback(self, callback):
+		"""
+		Call `callback` with the future once it is done, or right away if it
+		already is.
+		"""
+		if self.done:
+			callback(self)
+		else:
+			self.callbacks.append(callback)
+	
+	def result(self):
+		"""
+		Get the result, running the main loop until it is available. Errors
+		are raised.
+		"""
+		while not self.done:
+			iterate()
+		
+		if self.error is not None:
+			raise self.error
+		
+		return self.value
+
+def gather(*futures):
+	"""
+	Wait for all the futures and return their results, in the same order.
+	"""
+	return [future.result() for future in futures]
+
+class SignalStream:
+	"""
+	Iterator over the emissions of a signal. Each item is the tuple of the
+	arguments of the signal. Iterating runs the main loop until a signal is
+	received.
+	"""
+	def __init__(self, proxy, signal, interface, **keywords):
+		self.queue = collections.deque()
+		self.match = proxy.connect_to_signal(signal, self.received,
+			dbus_interface=interface, **keywords)
+	
+	def received(self, *args):
+		self.queue.append(args)
+	
+	def __iter__(self):
+		return self
+	
+	def next(self):
+		if self.match is None and not self.queue:
+			raise StopIteration
+		
+		while not self.queue:
+			iterate()
+		
+		return self.queue.popleft()
+	
+	def pending(self):
+		"""
+		Get the signals already received without running the main loop.
+		"""
+		items = list(self.queue)
+		self.queue.clear()
+		return items
+	
+	def close(self):
+		"""
+		Stop receiving the signal. Signals already received are still
+		iterated.
+		"""
+		if self.match is not None:
+			self.match.remove()
+			self.match = None
+
+class AsyncMPRIS:
+	"""
+	Non-blocking counterpart of `mpris.MPRIS`. Sub-interfaces are created on
+	first access.
+	"""
+	def __init__(self, conn, bus=None):
+		"""
+		:Parameters:
+			`conn` : string
+				one of `MPRIS.PLAYERS` or the unique name of the player
+			`bus` : dbus.Bus
+				connection used, defaults to the session bus ; it is shared
+				by all the instances
+		"""
+		self.bus   = bus or session_bus()
+		self.conn  = MPRIS.CONNECTION_PREFIX + conn
+		self.icon  = conn
+		self.mpris = self.bus.get_object(self.conn, MPRIS.OBJECT_PATH,
+			introspect=False)
+		self.properties = dbus.Interface(self.mpris, MPRIS.INTERFACE_PROPERTIES)
+	
+	def __getattr__(self, name):
+		if name == 'root':
+			self.root = AsyncRoot(self)
+		elif name == 'player':
+			self.player = AsyncPlayer(self)
+		elif name == 'tracklist':
+			self.tracklist = AsyncTrackList(self)
+		elif name == 'playlists':
+			self.playlists = AsyncPlaylists(self)
+		else:
+			raise AttributeError(name)
+		
+		return self.__dict__[name]
+
+class AsyncRemote:
+	"""
+	Base for non-blocking dbus remote objects.
+	"""
+	def __init__(self, mpris, interface):
+		self.mpris     = mpris
+		self.object    = dbus.Interface(mpris.mpris, interface)
+		self.interface = interface
+	
+	def call(self, method, signature=None, *args):
+		"""
+		Call a method of the interface.
+		
+		:return: a `Future` of the reply
+		"""
+		future = Future()
+		
+		self.object.get_dbus_method(method)(signature=signature,
+			reply_handler=future.set_result, error_handler=future.set_exception,
+			*args)
+		
+		return future
+	
+	def get(self, property, convert=True):
+		"""
+		Get a property.
+		
+		:return: a `Future` of the value
+		"""
+		future = Future()
+		
+		if convert:
+			future.convert = convert_value
+		
+		self.mpris.properties.Get(self.interface, property,
+			reply_handler=future.set_result, error_handler=future.set_exception)
+		
+		return future
+	
+	def get_all(self):
+		"""
+		Get all the properties of the interface with a single call.
+		
+		:return: a `Future` of the dict of the properties
+		"""
+		future = Future()
+		
+		self.mpris.properties.GetAll(self.interface,
+			reply_handler=future.set_result, error_handler=future.set_exception)
+		
+		return future
+	
+	def set(self, prop, value):
+		"""
+		Set a property.
+		
+		:return: a `Future` completed when the property is set
+		"""
+		future = Future()
+		
+		self.mpris.properties.Set(self.interface, prop, value,
+			reply_handler=future.set_result, error_handler=future.set_exception)
+		
+		return future
+	
+	def read_write(self, name, value):
+		"""
+		Get the property if `value` is None, set it otherwise.
+		"""
+		if value is None:
+			return self.get(name)
+		else:
+			return self.set(name, value)
+	
+	def signals(self, signal):
+		"""
+		Receive a signal of the interface.
+		
+		:return: a `SignalStream`
+		"""
+		return SignalStream(self.mpris.mpris, signal, self.interface)
+	
+	def on_PropertiesChanged(self):
+		"""
+		Receive the PropertiesChanged signal for this interface, see
+		`mpris.Remote.on_PropertiesChanged`.
+		
+		:return: a `SignalStream`
+		"""
+		return SignalStream(self.mpris.mpris, 'PropertiesChanged',
+			MPRIS.INTERFACE_PROPERTIES, arg0=self.interface)
+
+class AsyncRoot(AsyncRemote):
+	"""
+	Non-blocking counterpart of `mpris.Root`.
+	"""
+	def __init__(self, mpris):
+		AsyncRemote.__init__(self, mpris, MPRIS.INTERFACE_ROOT)
+	
+	def Raise(self):
+		return self.call('Raise')
+	
+	def Quit(self):
+		return self.call('Quit')
+	
+	def CanQuit(self):
+		return self.get('CanQuit')
+	
+	def Fullscreen(self, on=None):
+		return self.read_write('Fullscreen', on)
+	
+	def CanSetFullscreen(self):
+		return self.get('CanSetFullscreen')
+	
+	def HasTrackList(self):
+		return self.get('HasTrackList')
+	
+	def CanRaise(self):
+		return self.get('CanRaise')
+	
+	def Identity(self):
+		return self.get('Identity')
+	
+	def DesktopEntry(self):
+		return self.get('DesktopEntry')
+	
+	def SupportedUriSchemes(self):
+		return self.get('SupportedUriSchemes')
+	
+	def SupportedMimeTypes(self):
+		return self.get('SupportedMimeTypes')
+
+class AsyncPlayer(AsyncRemote):
+	"""
+	Non-blocking counterpart of `mpris.Player`.
+	"""
+	def __init__(self, mpris):
+		AsyncRemote.__init__(self, mpris, MPRIS.INTERFACE_PLAYER)
+	
+	def Next(self):
+		return self.call('Next')
+	
+	def Previous(self):
+		return self.call('Previous')
+	
+	def Pause(self):
+		return self.call('Pause')
+	
+	def PlayPause(self):
+		return self.call('PlayPause')
+	
+	def Stop(self):
+		return self.call('Stop')
+	
+	def Play(self):
+		return self.call('Play')
+	
+	def Seek(self, offset):
+		return self.call('Seek', 'x', offset)
+	
+	def SetPosition(self, track_id, position):
+		return self.call('SetPosition', 'ox', track_id, position)
+	
+	def OpenUri(self, uri):
+		return self.call('OpenUri', 's', uri)
+	
+	def PlaybackStatus(self):
+		return self.get('PlaybackStatus')
+	
+	def LoopStatus(self, value=None):
+		return self.read_write('LoopStatus', value)
+	
+	def Rate(self, rate=None):
+		return self.read_write('Rate', rate)
+	
+	def Shuffle(self, shuffle=None):
+		return self.read_write('Shuffle', shuffle)
+	
+	def Metadata(self):
+		return self.get('Metadata')
+	
+	def Volume(self, volume=None):
+		return self.read_write('Volume', volume)
+	
+	def Position(self):
+		return self.get('Position')
+	
+	def MinimumRate(self):
+		return self.get('MinimumRate')
+	
+	def MaximumRate(self):
+		return self.get('MaximumRate')
+	
+	def CanGoNext(self):
+		return self.get('CanGoNext')
+	
+	def CanGoPrevious(self):
+		return self.get('CanGoPrevious')
+	
+	def CanPlay(self):
+		return self.get('CanPlay')
+	
+	def CanPause(self):
+		return self.get('CanPause')
+	
+	def CanSeek(self):
+		return self.get('CanSeek')
+	
+	def CanControl(self):
+		return self.get('CanControl')
+	
+	def on_Seeked(self):
+		return self.signals('Seeked')
+
+class AsyncTrackList(AsyncRemote):
+	"""
+	Non-blocking counterpart of `mpris.TrackList`.
+	"""
+	def __init__(self, mpris):
+		AsyncRemote.__init__(self, mpris, MPRIS.INTERFACE_TRACKLIST)
+	
+	def GetTracksMetadata(self, track_ids):
+		return self.call('GetTracksMetadata', 'ao', track_ids)
+	
+	def AddTrack(self, uri, after_track, set_as_current):
+		return self.call('AddTrack', 'sob', uri, after_track, set_as_current)
+	
+	def RemoveTrack(self, track_id):
+		return self.call('RemoveTrack', 'o', track_id)
+	
+	def GoTo(self, track_id):
+		return self.call('GoTo', 'o', track_id)
+	
+	def Tracks(self):
+		return self.get('Tracks')
+	
+	def CanEditTracks(self):
+		return self.get('CanEditTracks')
+	
+	def on_TrackListReplaced(self):
+		return self.signals('TrackListReplaced')
+	
+	def on_TrackAdded(self):
+		return self.signals('TrackAdded')
+	
+	def on_TrackRemoved(self):
+		return self.signals('TrackRemoved')
+	
+	def on_TrackMetadataChanged(self):
+		return self.signals('TrackMetadataChanged')
+
+class AsyncPlaylists(AsyncRemote):
+	"""
+	Non-blocking counterpart of `mpris.Playlists`.
+	"""
+	def __init__(self, mpris):
+		AsyncRemote.__init__(self, mpris, MPRIS.INTERFACE_PLAYLISTS)
+	
+	def ActivatePlaylist(self, playlist_id):
+		return self.call('ActivatePlaylist', 'o', playlist_id)
+	
+	def GetPlaylists(self, index, max_count, order, reverse_order):
+		return self.call('GetPlaylists', 'uusb', index, max_count, order,
+			reverse_order)
+	
+	def PlaylistCount(self):
+		return self.get('PlaylistCount')
+	
+	def Orderings(self):
+		return self.get('Orderings')
+	
+	def ActivePlaylist(self):
+		return self.get('ActivePlaylist')
+	
+	def on_PlaylistChanged(self):
+		return self.signals('PlaylistChanged')
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+Control daemon keeping the `MPRIS` objects, and the caches of their remote
+objects, alive between commands.
+
+Clients send the command line of an action on a Unix socket, the daemon
+runs it and sends back the exit status and the output of the action.
+Nothing but the standard library is needed on the client side.
+"""
+
+__all__ = ('Daemon', 'socket_path', 'request')
+__docformat__ = 'reStructuredText'
+
+import os, sys, socket
+
+from StringIO import StringIO
+
+def socket_path():
+	"""
+	Default path of the socket of the daemon, private to the user.
+	"""
+	runtime = os.environ.get('XDG_RUNTIME_DIR')
+	
+	if runtime:
+		return os.path.join(runtime, "mpris-remote.sock")
+	
+	return os.path.join(os.environ.get('TMPDIR', "/tmp"),
+		"mpris-remote-%d.sock" % os.getuid())
+
+def read_all(sock):
+	"""
+	Read from `sock` until the peer shuts down its side.
+	"""
+	chunks = []
+	
+	while True:
+		chunk = sock.recv(4096)
+		
+		if not chunk:
+			break
+		
+		chunks.append(chunk)
+	
+	return "".join(chunks)
+
+def request(argv, path=None):
+	"""
+	Send a command to the daemon.
+	
+	:Parameters:
+		`argv` : list
+			action name followed by its arguments
+		`path` : string
+			path of the socket, see `socket_path`
+	
+	:return: a tuple (status, output), or None if no daemon is listening
+	"""
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	
+	try:
+		sock.connect(path or socket_path())
+	except socket.error:
+		sock.close()
+		return None
+	
+	try:
+		sock.sendall("\0".join(argv))
+		sock.shutdown(socket.SHUT_WR)
+		
+		status, _, output = read_all(sock).partition("\n")
+	finally:
+		sock.close()
+	
+	return int(status), output
+
+class Daemon:
+	"""
+	Serves actions received on a Unix socket from a GLib main loop. The
+	same main loop delivers the signals keeping the caches up to date.
+	"""
+	
+	def __init__(self, factory, handler, path=None):
+		"""
+		:Parameters:
+			`factory` : callable
+				builds the object the commands are run on, such as a
+				`mpris.Session`, once ; it is kept after D-Bus errors, the
+				handler takes care of the players which failed
+			`handler` : callable
+				runs a command, called with the object built by `factory` and
+				the command line
+			`path` : string
+				path of the socket, see `socket_path`
+		"""
+		self.factory = factory
+		self.handler = handler
+		self.path    = path or socket_path()
+		self.target  = None
+	
+	def serve(self):
+		"""
+		Listen on the socket and run the main loop, never returns.
+		"""
+		from mpris import mainloop
+		
+		gobject = mainloop()
+		
+		if os.path.exists(self.path):
+			if request(["ping"], self.path) is not None:
+				raise RuntimeError("a daemon is already listening on " + self.path)
+			
+			os.unlink(self.path)
+		
+		self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.socket.bind(self.path)
+		os.chmod(self.path, 0600)
+		self.socket.listen(16)
+		
+		gobject.io_add_watch(self.socket, gobject.IO_IN, self.accept)
+		
+		try:
+			gobject.MainLoop().run()
+		finally:
+			self.socket.close()
+			os.unlink(self.path)
+	
+	def accept(self, source, condition):
+		"""
+		Handles a client connection.
+		"""
+		client, address = self.socket.accept()
+		
+		try:
+			argv = read_all(client).split("\0")
+			status, output = self.run(argv)
+			client.sendall("%d\n%s" % (status, output))
+		except socket.error:
+			pass
+		finally:
+			client.close()
+		
+		return True
+	
+	def run(self, argv):
+		"""
+		Run a command, capturing its output and its exit status.
+		
+		:return: a tuple (status, output)
+		"""
+		import dbus
+		
+		status = 0
+		stdout = sys.stdout
+		sys.stdout = StringIO()
+		
+		try:
+			if argv[0] != "ping":
+				if self.target is None:
+					self.target = self.factory()
+				
+				self.handler(self.target, argv)
+		except SystemExit as e:
+			status = e.code or 0
+		except dbus.DBusException as e:
+			print "D-Bus error:", e
+			status = 1
+		except Exception as e:
+			print "error:", e
+			status = 1
+		finally:
+			output = sys.stdout.getvalue()
+			sys.stdout = stdout
+		
+		return status, output
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+"""
+Desktop notifications shown from a thread of their own, so that the
+actions controlling the player never wait for the notification daemon.
+
+Notifications sent in a burst, such as when skipping several tracks in a
+row, are coalesced : only the last one of the burst is shown. A single
+notification is kept and updated, instead of piling up a popup for each
+message.
+"""
+
+__all__ = ('Notifier',)
+__docformat__ = 'reStructuredText'
+
+import sys, time, threading, Queue
+
+class Notifier:
+	"""
+	Shows notifications with notify2 from a worker thread. `notify` only
+	queues the notification and returns.
+	"""
+	
+	def __init__(self, app_name, window=0.3):
+		"""
+		:Parameters:
+			`app_name` : string
+				name of the application given to the notification daemon,
+				or a callable returning it, called from the worker thread
+			`window` : float
+				time, in seconds, during which notifications following the
+				first one of a burst replace it
+		"""
+		self.app_name     = app_name
+		self.window       = window
+		self.queue        = Queue.Queue()
+		self.thread       = None
+		self.notification = None
+	
+	def notify(self, summary, body=None, icon=None):
+		"""
+		Queue a notification, starting the worker thread if needed. The
+		summary and the icon may be callables returning them, called from the
+		worker thread when the notification is shown.
+		"""
+		if self.thread is None:
+			from mpris import mainloop
+			
+			#
+			# dbus is used from the worker thread too.
+			#
+			mainloop()
+			
+			self.thread = threading.Thread(target=self.run,
+				name="mpris-notifier")
+			self.thread.daemon = True
+			self.thread.start()
+		
+		self.queue.put((summary, body, icon))
+	
+	def flush(self, timeout=2):
+		"""
+		Show the pending notification without waiting for the end of the
+		window, and wait for it to be shown, for at most `timeout` seconds.
+		"""
+		if self.thread is None:
+			return
+		
+		done = threading.Event()
+		self.queue.put(done)
+		done.wait(timeout)
+	
+	def run(self):
+		"""
+		Main function of the worker thread.
+		"""
+		while True:
+			item    = self.queue.get()
+			pending = None
+			
+			if isinstance(item, tuple):
+				pending  = item
+				deadline = time.time() + self.window
+				
+				#
+				# Keep the last notification received during the window, or
+				# until a flush.
+				#
+				while True:
+					remaining = deadline - time.time()
+					
+					if remaining <= 0:
+						break
+					
+					try:
+						item = self.queue.get(timeout=remaining)
+					except Queue.Empty:
+						break
+					
+					if not isinstance(item, tuple):
+						break
+					
+					pending = item
+			
+			if pending is not None:
+				self.show(*pending)
+			
+			if not isinstance(item, tuple):
+				item.set()
+	
+	def show(self, summary, body, icon):
+		"""
+		Show a notification, from the worker thread.
+		"""
+		try:
+			if callable(summary):
+				summary = summary()
+			
+			if callable(icon):
+				icon = icon()
+			
+			if self.notification is None:
+				import notify2
+				
+				if callable(self.app_name):
+					self.app_name = self.app_name()
+				
+				notify2.init(self.app_name)
+				self.notification = notify2.Notification(summary, body, icon)
+			else:
+				self.notification.update(summary, body, icon)
+			
+			self.notification.show()
+		except Exception as e:
+			print >>sys.stderr, "notification failed:", e
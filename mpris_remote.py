@@ -3,72 +3,89 @@
 
 __docformat__ = 'reStructuredText'
 
-import sys
-from mpris import MPRIS, list_available_connection, \
-	find_mpris_connection
+import sys, os, time
+import mpris_daemon
 
 from gettext import gettext as _
 
 class Action_Play:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		status = mpris.player.PlaybackStatus()
 		
 		if status != "Playing":
 			mpris.player.Play()
 			return "Play"
 	
+	def submit(self, mpris, batch, *args):
+		return mpris.player.submit(batch, "Play")
+	
 	def __str__(self):
 		return _("if the player is paused, playbacks resumes, if stopped,\
 playbacks starts, else nothing happens")
 
 class Action_PlayPause:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		mpris.player.PlayPause()
 		return mpris.player.PlaybackStatus()
 	
+	def submit(self, mpris, batch, *args):
+		return mpris.player.submit(batch, "PlayPause")
+	
 	def __str__(self):
 		return ""
 
 class Action_Pause:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		status = mpris.player.PlaybackStatus()
 		
 		if status == "Playing":
 			mpris.player.Pause()
 			return "Pause"
 	
+	def submit(self, mpris, batch, *args):
+		return mpris.player.submit(batch, "Pause")
+	
 	def __str__(self):
 		return ""
 
 class Action_Stop:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		status = mpris.player.PlaybackStatus()
 		
 		if status != "Stopped":
 			mpris.player.Stop()
 			return "Stop"
 	
+	def submit(self, mpris, batch, *args):
+		return mpris.player.submit(batch, "Stop")
+	
 	def __str__(self):
 		return ""
 
 class Action_Next:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		mpris.player.Next()
 		return "Next song"
 	
+	def submit(self, mpris, batch, *args):
+		return mpris.player.submit(batch, "Next")
+	
 	def __str__(self):
 		return ""
 
 class Action_Previous:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		mpris.player.Previous()
 		return "Previous song"
 	
+	def submit(self, mpris, batch, *args):
+		return mpris.player.submit(batch, "Previous")
+	
 	def __str__(self):
 		return ""
 
 class Action_IsPlaying:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		status = mpris.player.PlaybackStatus()
 		
 		if status == 'Playing':
@@ -80,13 +97,234 @@ class Action_IsPlaying:
 		return ""
 
 class Action_GetCurrentTrack:
-	def do(self, mpris):
+	def do(self, mpris, *args):
 		print "\"%s\" on \"%s\" by %s" % (mpris.metadata.title(), \
-			mpris.metadata.album(), mpris.metadata.artist())
+			mpris.metadata.album(), ", ".join(mpris.metadata.artist()))
 	
 	def __str__(self):
 		return ""
 
+def number(args, usage):
+	"""
+	Parse the first argument of an action as a number, exit with a usage
+	message if it is missing or invalid.
+	"""
+	try:
+		return float(args[0])
+	except (IndexError, ValueError):
+		print "usage:", usage
+		exit(1)
+
+class Action_Volume:
+	def do(self, mpris, *args):
+		if len(args) == 0:
+			print "%d%%" % round(mpris.player.Volume() * 100)
+		else:
+			volume = number(args, "volume [0.0 - 1.0]")
+			mpris.player.Volume(volume)
+			return "Volume %d%%" % round(volume * 100)
+	
+	def submit(self, mpris, batch, *args):
+		if len(args) > 0:
+			return mpris.player.submit_set(batch, "Volume",
+				number(args, "volume [0.0 - 1.0]"))
+	
+	def __str__(self):
+		return _("print the volume, or set it to the given value between 0.0 \
+and 1.0")
+
+class Action_Seek:
+	def do(self, mpris, *args):
+		mpris.player.Seek(int(number(args, "seek seconds") * 1000000))
+	
+	def submit(self, mpris, batch, *args):
+		return mpris.player.submit(batch, "Seek", "x",
+			(int(number(args, "seek seconds") * 1000000),))
+	
+	def __str__(self):
+		return _("seek forward by the given number of seconds, backward if \
+negative")
+
+class Action_Playlist:
+	def do(self, mpris, *args):
+		name = " ".join(args).strip()
+		
+		if not name:
+			print "usage: playlist name"
+			exit(1)
+		
+		playlist = mpris.playlists.index().find(name)
+		
+		if playlist is None:
+			print "no playlist named", name
+			exit(1)
+		
+		mpris.playlists.ActivatePlaylist(playlist[0])
+		return "Playlist " + playlist[1]
+	
+	def __str__(self):
+		return _("activate the playlist with the given name, ignoring case, or \
+the first one starting with it")
+
+def tracklist(mpris):
+	"""
+	Get the tracklist of the player, exit if it has none.
+	"""
+	if not mpris.root.HasTrackList():
+		print "the player has no tracklist"
+		exit(1)
+	
+	return mpris.tracklist
+
+class Action_GoTo:
+	def do(self, mpris, *args):
+		query  = " ".join(args)
+		tracks = tracklist(mpris).index().search(query, 1)
+		
+		if len(tracks) == 0:
+			print "no track matching", query
+			exit(1)
+		
+		mpris.tracklist.GoTo(tracks[0])
+		track = mpris.tracklist.fetch_metadata(tracks)[0]
+		
+		return "Go to " + (track and track.title or tracks[0])
+	
+	def __str__(self):
+		return _("skip to the track of the tracklist best matching the given \
+words, searched in titles, artists, albums, composers and genres")
+
+class Action_Enqueue:
+	def do(self, mpris, *args):
+		uris = []
+		
+		for arg in args:
+			if "://" in arg:
+				uris.append(arg)
+			elif os.path.isdir(arg):
+				for root, dirs, files in os.walk(arg):
+					dirs.sort()
+					
+					for name in sorted(files):
+						uris.append(file_uri(os.path.join(root, name)))
+			else:
+				uris.append(file_uri(arg))
+		
+		accepted, rejected = tracklist(mpris).supported(uris)
+		
+		start = time.time()
+		
+		try:
+			added = mpris.tracklist.add_tracks(accepted)
+		except RuntimeError as e:
+			print e
+			exit(1)
+		
+		spent = time.time() - start
+		count = len([track_id for track_id in added if track_id is not None])
+		
+		print "%d track(s) added in %.2f s (%.0f tracks/s), %d skipped, %d refused" % \
+			(count, spent, count / max(spent, 0.001), len(rejected),
+				len(added) - count)
+		
+		return "Enqueued %d track(s)" % count
+	
+	def resolve(self, *args):
+		"""
+		Make the paths absolute on the client side, the daemon has a working
+		directory of its own.
+		"""
+		return [arg if "://" in arg else os.path.abspath(arg) for arg in args]
+	
+	def __str__(self):
+		return _("add files, directories or URIs at the end of the tracklist")
+
+def file_uri(path):
+	#
+	# urllib pulls in ssl and socket, it is only imported when needed.
+	#
+	import urllib
+	
+	return "file://" + urllib.pathname2url(os.path.abspath(path))
+
+class Action_Batch:
+	"""
+	Run a sequence of actions separated by BATCH_SEPARATOR. Method calls of
+	consecutive actions are sent without waiting for the replies, D-Bus
+	keeping them in order. Actions which need to read the state of the
+	player, or have no `submit` method, wait for the calls in flight before
+	they run. An action failing does not stop the following ones. Results
+	and timings are reported at the end.
+	"""
+	def do(self, mpris, *args):
+		from mpris import Batch
+		
+		batch    = Batch(mpris.bus)
+		commands = []
+		results  = []
+		start    = time.time()
+		
+		for arg in args:
+			if arg == BATCH_SEPARATOR or len(commands) == 0:
+				commands.append([])
+			
+			if arg != BATCH_SEPARATOR:
+				commands[-1].append(arg)
+		
+		for command in commands:
+			if len(command) == 0:
+				continue
+			
+			name   = command[0].lower()
+			action = ACTIONS.get(name)
+			reply  = None
+			error  = None
+			sent   = time.time()
+			
+			if action is None or isinstance(action, Action_Batch):
+				results.append((command, None, "unknown command", sent, sent))
+				continue
+			
+			try:
+				if hasattr(action, "submit"):
+					reply = action.submit(mpris, batch, *command[1:])
+				
+				if reply is None:
+					batch.wait()
+					action.do(mpris, *command[1:])
+			except (ValueError, IndexError):
+				error = "invalid arguments"
+			except SystemExit as e:
+				error = "exit %s" % e.code
+			except Exception as e:
+				error = str(e)
+			
+			results.append((command, reply, error, sent, time.time()))
+		
+		batch.wait()
+		
+		for command, reply, error, sent, done in results:
+			if reply is not None:
+				try:
+					reply.wait()
+				except Exception as e:
+					error = str(e)
+				
+				done = reply.time or done
+			
+			print "%-30s %-6s %8.2f ms %s" % (" ".join(command),
+				error is None and "ok" or "error", (done - sent) * 1000,
+				error or "")
+		
+		print "%d action(s) in %.2f ms" % (len(results),
+			(time.time() - start) * 1000)
+	
+	def __str__(self):
+		return _("run several actions separated by '%s', or read from the \
+standard input one per line if the action is '-'") % BATCH_SEPARATOR
+
+BATCH_SEPARATOR = ";"
+
 ACTIONS = { \
 	"play"				: Action_Play(), 			\
 	"pause" 			: Action_Pause(), 			\
@@ -95,54 +333,259 @@ ACTIONS = { \
 	"next"				: Action_Next(), 			\
 	"previous"			: Action_Previous(), 		\
 	"is_playing"		: Action_IsPlaying(), 		\
-	"get_current_track"	: Action_GetCurrentTrack() 	\
+	"get_current_track"	: Action_GetCurrentTrack(), \
+	"volume"			: Action_Volume(),			\
+	"seek"				: Action_Seek(),			\
+	"playlist"			: Action_Playlist(),		\
+	"goto"				: Action_GoTo(),			\
+	"enqueue"			: Action_Enqueue(),			\
+	"batch"				: Action_Batch()			\
 }
 
 def usage():
-	print "Usage:", sys.argv[0], "action", "[args]"
+	print "Usage:", sys.argv[0], "[options]", "action", "[args]", \
+		"[%s action [args] ...]" % BATCH_SEPARATOR
+	print "      ", sys.argv[0], "[options]", "-"
+	print "      ", sys.argv[0], "--help"
+	print "      ", sys.argv[0], "--daemon"
+	print ""
+	print "where options are :"
+	print "  - --player NAME : control the given player"
+	print "  - --all : control all the players"
 	print ""
 	print "where action is :"
 	for k in ACTIONS:
 		print "  -", k, ":", str(ACTIONS[k])
-
-if len(sys.argv) < 2:
-	usage()
 	print ""
-	list_available_connection()
-	exit(1)
-else:
-	conn = None
+	print "Without option, the active player is controlled : the one playing, or"
+	print "the one which started playing last when a daemon is running."
+	print "When a daemon is running, actions are sent to it."
+
+def parse_options(argv):
+	"""
+	Split the options from the action and its arguments.
 	
-	if conn is None:
-	#
-	# No connection specified in parameters.
-	# Try to found one.
-	#
-		connections = find_mpris_connection()
+	:return: a tuple (options, rest) where options is a dict with the keys
+		'player' and 'all'
+	"""
+	options = { 'player' : None, 'all' : False }
 	
-		if len(connections) == 0:
-			print "No MPRIS connection found."
-			exit(1)
-		elif len(connections) > 1:
-			print "Multiple MPRIS connections found."
-			list_available_connection()
-			exit(1)
+	while len(argv) > 0:
+		if argv[0] == "--all":
+			options['all'] = True
+			argv = argv[1:]
+		elif argv[0] == "--player" and len(argv) > 1:
+			options['player'] = argv[1]
+			argv = argv[2:]
+		else:
+			break
+	
+	return options, argv
+
+def resolve(command):
+	"""
+	Let the actions of a command, or of a batch, rewrite their arguments
+	before the command is sent to the daemon, see `Action_Enqueue.resolve`.
+	"""
+	resolved = []
+	segment  = []
+	
+	for arg in command + [BATCH_SEPARATOR]:
+		if arg != BATCH_SEPARATOR:
+			segment.append(arg)
+			continue
 		
-		conn = connections.keys()[0]
+		if len(segment) > 0:
+			action = ACTIONS.get(segment[0].lower())
+			
+			if hasattr(action, "resolve"):
+				segment = segment[:1] + action.resolve(*segment[1:])
+		
+		resolved += segment + [arg]
+		segment   = []
 	
-	action = sys.argv[1]
-	args = sys.argv[2:]
+	return resolved[:-1]
+
+def find_connection():
+	"""
+	Find the available players, from the cache of the last discovery, exit
+	if there is none.
 	
-	mpris = MPRIS(conn)
+	:return: dict of the identities of the players indexed by name
+	"""
+	from mpris import cached_mpris_connection
 	
-	action = action.lower()
-	msg = None
+	connections = cached_mpris_connection()
 	
-	if action in ACTIONS:
-		msg = ACTIONS[action].do(mpris)
-	else:
+	if len(connections) == 0:
+		print "No MPRIS connection found."
+		exit(1)
+	
+	return connections
+
+def perform(argv, session=None):
+	"""
+	Run an action on the players selected by the options in front of it.
+	Without `session`, one is only created if there is more than one
+	player to choose from, from the players found by `find_connection`.
+	
+	With a session, a player whose action fails with a D-Bus error is
+	created again, see `mpris.Session.refresh`.
+	"""
+	from mpris import MPRIS, Session
+	from dbus import DBusException
+	
+	options, argv = parse_options(argv)
+	
+	if len(argv) == 0:
+		usage()
+		exit(1)
+	
+	action = ACTIONS.get(argv[0].lower())
+	args   = argv[1:]
+	
+	if action is None:
 		print "unknown command"
+		return
+	
+	if options['all']:
+		if session is None:
+			session = Session(players=find_connection().keys())
+		
+		run_all(session, action, args)
+		return
+	
+	player = options['player']
+	
+	if player is not None:
+		try:
+			if session is not None:
+				mpris = session.get(player)
+			else:
+				mpris = MPRIS(player)
+		except (KeyError, DBusException):
+			print "No player named", player
+			exit(1)
+	elif session is not None:
+		player = session.current
+		mpris  = session.active()
+	else:
+		connections = find_connection()
+		
+		if len(connections) == 1:
+			mpris = MPRIS(connections.keys()[0])
+		else:
+			mpris = Session(players=connections.keys()).active()
+	
+	if mpris is None:
+		print "No MPRIS connection found."
+		exit(1)
+	
+	try:
+		msg = action.do(mpris, *args)
+	except DBusException:
+		if session is not None:
+			session.refresh(player)
+		
+		raise
 	
 	if msg is not None:
 		mpris.notify(msg)
+		
+		if session is None:
+			mpris.flush_notifications()
+
+def run_all(session, action, args):
+	"""
+	Run an action on all the players of a session. Method calls of the
+	actions which have a `submit` method are sent to all the players at
+	once, the other actions are run on each player in turn.
+	"""
+	from mpris import Batch
+	
+	batch   = Batch(session.bus)
+	replies = []
+	
+	for player in session:
+		mpris = session.get(player)
+		reply = None
+		
+		if hasattr(action, "submit"):
+			reply = action.submit(mpris, batch, *args)
+		
+		if reply is None:
+			batch.wait()
+			
+			if len(session) > 1:
+				print player, ":"
+			
+			action.do(mpris, *args)
+		else:
+			replies.append((player, reply))
+	
+	batch.wait()
+	
+	for player, reply in replies:
+		try:
+			reply.wait()
+		except Exception as e:
+			print player, ":", e
+
+def daemon():
+	"""
+	Run the control daemon, see `mpris_daemon`. The players are followed by
+	a `Session`, which keeps an `MPRIS` object for each of them.
+	"""
+	from mpris import Session
+	
+	mpris_daemon.Daemon(lambda: Session(watch=True),
+		lambda session, argv: perform(argv, session)).serve()
+
+def main(argv):
+	#
+	# Usage, argument parsing and requests to the daemon only need the
+	# standard library, mpris (and dbus) is imported past them.
+	#
+	if len(argv) < 2:
+		usage()
+		print ""
+		sys.stdout.flush()
+		
+		from mpris import list_available_connection
+		
+		list_available_connection()
+		exit(1)
+	
+	if argv[1] in ("-h", "--help"):
+		usage()
+		exit(0)
+	
+	if argv[1] == "--daemon":
+		daemon()
+		return
+	
+	options, command = parse_options(argv[1:])
+	argv = argv[:len(argv) - len(command)]
+	
+	if command == ["-"]:
+		argv += ["batch"]
+		
+		for line in sys.stdin:
+			if line.strip():
+				argv += resolve(line.split()) + [BATCH_SEPARATOR]
+	elif BATCH_SEPARATOR in command:
+		argv += ["batch"] + resolve(command)
+	else:
+		argv += resolve(command)
+	
+	reply = mpris_daemon.request(argv[1:])
+	
+	if reply is not None:
+		status, output = reply
+		sys.stdout.write(output)
+		exit(status)
+	
+	perform(argv[1:])
 
+if __name__ == "__main__":
+	main(sys.argv)